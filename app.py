@@ -1,13 +1,32 @@
-from flask import Flask, render_template, request, flash, redirect, url_for
+from flask import (Flask, render_template, request, flash, redirect, url_for, jsonify, Response, stream_with_context,
+                   has_app_context, send_file, session, make_response, get_flashed_messages)
 from storage.database import data_manager
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import requests
-from flask_migrate import Migrate
+from flask_migrate import Migrate, stamp
 from sqlalchemy import exc
-from genai.movies_rec_ai import get_instructions, open_chat, get_chat_ai_recommendations
+from genai.movies_rec_ai import get_instructions, open_chat, get_chat_ai_recommendations, stream_chat_ai_recommendations
+from genai.chat_store import ChatSessionStore, MemoryChatBackend, SQLiteChatBackend
+from genai.library_summary import summarize_library
+from storage.engine_config import get_engine_options, register_sqlite_pragmas
+from storage.cache import LRUCache, SQLiteCache, TieredCache
+from storage.poster_cache import PosterCache, PosterError, POSTER_SIZES
+from storage.search import normalize_title
+from storage.library_export import EXPORT_FORMATS, export_format, export_chunks, read_export
+from network.http_client import HTTPClient, CircuitOpenError
+from jobs.queue import JobQueue, QueueFullError
+from monitoring.metrics import registry, register_cache, track_dependency
+from monitoring.flask_metrics import instrument_app, instrument_sqlalchemy, record_timing
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FutureTimeoutError
 import functools
+import click
+import hashlib
+import time
+import json
+import csv
+import io
 
 load_dotenv()
 app = Flask(__name__)
@@ -15,6 +34,10 @@ app.secret_key = os.getenv('SECRET_KEY')
 API_KEY = os.getenv('API_KEY')
 
 app.config['SQLALCHEMY_DATABASE_URI'] = data_manager.db_file_name
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options()
+register_sqlite_pragmas()
+instrument_sqlalchemy()
+instrument_app(app, server_timing=os.getenv('SERVER_TIMING', 'false').lower() == 'true')
 migrate = Migrate(app, data_manager.db)
 try:
     data_manager.db.init_app(app)
@@ -22,24 +45,115 @@ except exc.ArgumentError as e:
     print(f"Impossible to connect to the database: {e}")
     quit()
 
-users_chats = dict()
+INSTRUCTIONS_PATH = 'genai/instructions.txt'
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 400))
+CHAT_STORE_DB = os.getenv('CHAT_STORE_DB')
+if CHAT_STORE_DB:
+    chat_backend = SQLiteChatBackend(CHAT_STORE_DB, max_sessions=int(os.getenv('CHAT_MAX_SESSIONS', 10000)))
+else:
+    chat_backend = MemoryChatBackend(max_sessions=int(os.getenv('CHAT_MAX_SESSIONS', 1000)),
+                                     max_bytes=int(os.getenv('CHAT_MAX_BYTES', 16 * 1024 * 1024)))
+chat_sessions = ChatSessionStore(chat_backend, open_chat, idle_ttl=int(os.getenv('CHAT_IDLE_TTL', 1800)),
+                                 max_history=int(os.getenv('CHAT_MAX_HISTORY', 10)))
+
+OMDB_URL = os.getenv('OMDB_URL', 'http://www.omdbapi.com/')
+omdb_client = HTTPClient.from_env('OMDB')
+
+MOVIE_NOT_FOUND = {"Response": "False", "Error": "Movie not found!"}
+OMDB_CACHE_TTL = int(os.getenv('OMDB_CACHE_TTL', 86400))
+OMDB_NEGATIVE_CACHE_TTL = int(os.getenv('OMDB_NEGATIVE_CACHE_TTL', 3600))
+OMDB_CACHE_DB = os.getenv('OMDB_CACHE_DB')
+omdb_cache = TieredCache(
+    LRUCache(max_size=int(os.getenv('OMDB_CACHE_SIZE', 1024)), ttl=OMDB_CACHE_TTL),
+    SQLiteCache(OMDB_CACHE_DB, ttl=OMDB_CACHE_TTL) if OMDB_CACHE_DB else None
+)
+
+register_cache('omdb_memory', omdb_cache.memory.stats.as_dict)
+if omdb_cache.disk is not None:
+    register_cache('omdb_disk', omdb_cache.disk.stats.as_dict)
+CATALOG_MAX_AGE = timedelta(days=float(os.getenv('CATALOG_MAX_AGE_DAYS', 30)))
+CATALOG_LOAD_BATCH = int(os.getenv('CATALOG_LOAD_BATCH', 1000))
+
+POSTER_DEADLINE = float(os.getenv('POSTER_DEADLINE', 5))
+omdb_executor = ThreadPoolExecutor(max_workers=int(os.getenv('OMDB_WORKERS', 8)), thread_name_prefix='omdb')
+poster_cache = PosterCache(os.getenv('POSTER_CACHE_DIR', 'database/posters'),
+                           HTTPClient.from_env('POSTER', per_host_breaker=True),
+                           max_bytes=int(os.getenv('POSTER_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+                           max_download_bytes=int(os.getenv('POSTER_MAX_DOWNLOAD_BYTES', 10 * 1024 * 1024)),
+                           allow_private=os.getenv('POSTER_ALLOW_PRIVATE_HOSTS', 'false').lower() == 'true')
+poster_executor = ThreadPoolExecutor(max_workers=int(os.getenv('POSTER_PREFETCH_WORKERS', 2)),
+                                     thread_name_prefix='poster')
+
+MAX_IMPORT_TITLES = int(os.getenv('MAX_IMPORT_TITLES', 200))
+MAX_API_BATCH = int(os.getenv('MAX_API_BATCH', 500))
+LIBRARY_IMPORT_BATCH = int(os.getenv('LIBRARY_IMPORT_BATCH', 1000))
+USER_FIELDS = ('id', 'name')
+MOVIE_FIELDS = ('id', 'user_id', 'movie_id', 'title', 'director', 'year', 'rating', 'poster', 'personal_rating')
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 24))
+MAX_PAGE_SIZE = 100
+MOVIE_SORT_KEYS = ('title', 'year', 'rating')
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', 50))
+
+recommendation_cache = LRUCache(max_size=int(os.getenv('RECOMMENDATION_CACHE_SIZE', 512)),
+                                ttl=int(os.getenv('RECOMMENDATION_CACHE_TTL', 3600)))
+data_manager.add_write_listener(
+    lambda user_id: recommendation_cache.delete_matching(lambda key: key[0] == str(user_id)))
+register_cache('recommendations', recommendation_cache.stats.as_dict)
+
+page_cache = LRUCache(max_size=int(os.getenv('PAGE_CACHE_SIZE', 256)), ttl=int(os.getenv('PAGE_CACHE_TTL', 600)))
+data_manager.add_write_listener(lambda user_id: page_cache.delete_matching(lambda key: key[1] == user_id))
+register_cache('pages', page_cache.stats.as_dict)
+if data_manager.query_cache is not None:
+    register_cache('queries', data_manager.query_cache.stats.as_dict)
+
+JOB_POLL_INTERVAL = int(os.getenv('JOB_POLL_INTERVAL', 2))
+STREAM_RECOMMENDATIONS = os.getenv('STREAM_RECOMMENDATIONS', 'false').lower() == 'true'
+recommendation_jobs = JobQueue(workers=int(os.getenv('RECOMMENDATION_WORKERS', 2)),
+                               max_pending=int(os.getenv('RECOMMENDATION_QUEUE_SIZE', 100)),
+                               result_ttl=int(os.getenv('RECOMMENDATION_RESULT_TTL', 600)))
+
+
+def flashed(error):
+
+    """Flashes a validation error message if there is one and returns True if there was none."""
+
+    if error:
+        flash(error, 'error')
+        return False
+    return True
 
 
-def validate_username(username: str):
+def username_error(username):
 
-    """Validates the username by ensuring it is non-empty,
-    within 30 characters, and not already in the database."""
+    """Returns the reason why the username cannot be used (blank, over 30 characters or already in the database),
+    or None if it is valid."""
 
     if not username or username.isspace():
-        flash('Name must not be blank!', 'error')
-        return False
+        return 'Name must not be blank!'
     if len(username) > 30:
-        flash('Maximum 30 characters are allowed!', 'error')
-        return False
+        return 'Maximum 30 characters are allowed!'
     if data_manager.user_in_database(username):
-        flash('User is already existed. Choose another name.', 'error')
-        return False
-    return True
+        return 'User is already existed. Choose another name.'
+    return None
+
+
+def validate_username(username: str):
+
+    """Validates the username by ensuring it is non-empty,
+    within 30 characters, and not already in the database."""
+
+    return flashed(username_error(username))
+
+
+def title_error(title):
+
+    """Returns the error message of a movie title that is blank or exceeds 100 characters, or None if it is valid."""
+
+    if not title or title.isspace():
+        return 'Title must not be blank!'
+    if title and len(title) > 100:
+        return 'Maximum 100 characters are allowed!'
+    return None
 
 
 def validate_title(title):
@@ -49,13 +163,19 @@ def validate_title(title):
     Returns True if valid, False otherwise with appropriate flash message.
     """
 
-    if not title or title.isspace():
-        flash('Title must not be blank!', 'error')
-        return False
-    if title and len(title) > 100:
-        flash('Maximum 100 characters are allowed!', 'error')
-        return False
-    return True
+    return flashed(title_error(title))
+
+
+def director_error(director):
+
+    """Returns the error message of a director name that is only whitespace or exceeds 100 characters,
+    or None if it is valid."""
+
+    if director and director.isspace():
+        return 'Only spaces are not allowed'
+    if director and len(director) > 100:
+        return 'Maximum 100 characters are allowed!'
+    return None
 
 
 def validate_director(director):
@@ -65,55 +185,69 @@ def validate_director(director):
     Returns True if valid, False otherwise with appropriate flash message.
     """
 
-    if director and director.isspace():
-        flash('Only spaces are not allowed', 'error')
-        return False
-    if director and len(director) > 100:
-        flash('Maximum 100 characters are allowed!', 'error')
-        return False
-    return True
+    return flashed(director_error(director))
 
 
-def validate_year(year):
+def year_error(year):
 
-    """
-    Validates movie release year - must be between 1890 and current year.
-    Returns True if valid or empty, False otherwise with appropriate flash message.
-    """
+    """Returns the error message of a release year that is not a number between 1890 and the current year,
+    or None if it is valid or empty."""
 
-    if year:
+    if year not in (None, ''):
         min_year = 1890
         max_year = datetime.now().year
         try:
             year = int(year)
             if year < min_year or year > max_year:
-                flash(f"Wrong format of the year! Minimum: {min_year}, Maximum: {max_year}", 'error')
-                return False
+                return f"Wrong format of the year! Minimum: {min_year}, Maximum: {max_year}"
         except (ValueError, Exception) as e:
             print(f"Wrong format of the year: {e}")
-            flash('Wrong format of the year!', 'error')
-            return False
-    return True
+            return 'Wrong format of the year!'
+    return None
 
 
-def validate_rating(rating):
+def validate_year(year):
 
     """
-    Validates movie rating - must be a number between 0 and 10.
+    Validates movie release year - must be between 1890 and current year.
     Returns True if valid or empty, False otherwise with appropriate flash message.
     """
 
-    if rating:
+    return flashed(year_error(year))
+
+
+def rating_error(rating):
+
+    """Returns the error message of a rating that is not a number between 0 and 10, or None if it is valid or empty."""
+
+    if rating not in (None, ''):
         try:
             rating = float(rating)
             if rating > 10 or rating < 0:
-                flash('Wrong format of the rating! Maximum: 10, Minimum: 0.', 'error')
-                return False
+                return 'Wrong format of the rating! Maximum: 10, Minimum: 0.'
         except (ValueError, Exception) as e:
             print(f"Wrong format of the rating: {e}")
-            flash('Wrong format of the rating!', 'error')
-            return False
-    return True
+            return 'Wrong format of the rating!'
+    return None
+
+
+def validate_rating(rating):
+
+    """
+    Validates movie rating - must be a number between 0 and 10.
+    Returns True if valid or empty, False otherwise with appropriate flash message.
+    """
+
+    return flashed(rating_error(rating))
+
+
+def poster_error(poster):
+
+    """Returns the error message of a poster URL consisting of only whitespace, or None if it is valid."""
+
+    if poster and poster.isspace():
+        return 'Only spaces are not allowed'
+    return None
 
 
 def validate_poster(poster):
@@ -123,10 +257,11 @@ def validate_poster(poster):
     Returns True if valid, False otherwise with appropriate flash message.
     """
 
-    if poster and poster.isspace():
-        flash('Only spaces are not allowed', 'error')
-        return False
-    return True
+    return flashed(poster_error(poster))
+
+
+MOVIE_FIELD_ERRORS = {'title': title_error, 'director': director_error, 'year': year_error, 'rating': rating_error,
+                      'poster': poster_error}
 
 
 def validate_movie_data(title, director=None, year=None, rating=None, poster=None):
@@ -148,6 +283,32 @@ def validate_movie_data(title, director=None, year=None, rating=None, poster=Non
     return data
 
 
+def api_error_message(e):
+
+    """
+    Logs an exception raised while fetching data from the OMDb API
+    and returns the message to show to the user, or None if the error must stay hidden.
+    """
+
+    if isinstance(e, CircuitOpenError):
+        print(f"The API is temporarily disabled: {e}")
+        return 'Something went wrong, try again later.'
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        print(f"Impossible to connect to the API: {e}")
+        return 'Problem with the internet connection.'
+    if isinstance(e, requests.exceptions.JSONDecodeError):
+        print(f"No data from the API: {e}")
+        return 'Something went wrong, try again later.'
+    if isinstance(e, ValueError):
+        print(f"The following error has occurred: {e}")
+        e = str(e)
+        if not 'hidden' in e:
+            return e
+        return None
+    print(f'The following error has occurred: {e}')
+    return 'Something went wrong, try again later.'
+
+
 def validate_data_api(func):
 
     """Decorator that wraps an API function to handle exceptions and flash error messages for API-related errors."""
@@ -157,20 +318,10 @@ def validate_data_api(func):
         try:
             data = func(*args, **kwargs)
             return data
-        except requests.exceptions.ConnectionError as e:
-            print(f"Impossible to connect to the API: {e}")
-            flash('Problem with the internet connection.', 'error')
-        except requests.exceptions.JSONDecodeError as e:
-            print(f"No data from the API: {e}")
-            flash('Something went wrong, try again later.', 'error')
-        except ValueError as e:
-            print(f"The following error has occurred: {e}")
-            e = str(e)
-            if not 'hidden' in e:
-                flash(e, 'error')
         except Exception as e:
-            print(f'The following error has occurred: {e}')
-            flash('Something went wrong, try again later.', 'error')
+            message = api_error_message(e)
+            if message:
+                flash(message, 'error')
     return wrapper
 
 
@@ -197,7 +348,7 @@ def validate_year_api(year):
 
     if not year or year == 'N/A':
         year = None
-    if '–' in year:
+    if year and '–' in year:
         year = year.split('–')[0]
         year = ''.join(year)
     if year:
@@ -251,7 +402,7 @@ def validate_response(response):
     Raises ValueError if movie was not found in the external API.
     """
 
-    if response == {"Response": "False", "Error": "Movie not found!"}:
+    if response == MOVIE_NOT_FOUND:
         raise ValueError("Such movie doesn't exist!")
 
 
@@ -279,18 +430,146 @@ def db_connection_handler(func):
     return wrapper
 
 
-@validate_data_api
-def get_data_api(movie_input, user_id):
+def catalog_entry(parsed_response):
 
-    """Fetches and processes movie data from the OMDb API for a given movie input and user ID,
-    ensuring the movie exists and is not already added."""
+    """Converts a found OMDb response into a catalog row, or returns None if it has no IMDb ID to be keyed by."""
+
+    imdb_id = parsed_response.get('imdbID')
+    title = parsed_response.get('Title')
+    if not imdb_id or imdb_id == 'N/A' or not title or title == 'N/A':
+        return None
+    return {'imdb_id': imdb_id,
+            'title': title,
+            'title_key': normalize_title(title),
+            'director': validate_director_api(parsed_response.get('Director')),
+            'year': validate_year_api(parsed_response.get('Year')),
+            'rating': validate_rating_api(parsed_response.get('imdbRating')),
+            'poster': validate_poster_api(parsed_response.get('Poster')),
+            'fetched_at': datetime.now()}
+
+
+def catalog_response(movie):
+
+    """Converts a catalog movie back into the OMDb response format used by the rest of the app."""
+
+    def value(field):
+        return 'N/A' if field is None else str(field)
+
+    return {'Response': 'True', 'imdbID': movie.imdb_id, 'Title': movie.title, 'Director': value(movie.director),
+            'Year': value(movie.year), 'imdbRating': value(movie.rating), 'Poster': value(movie.poster)}
+
+
+def get_catalog_movie(key):
+
+    """Looks the normalized title up in the local catalog; errors are only logged, so the API remains a fallback."""
+
+    if not has_app_context():
+        return None
+    try:
+        return data_manager.get_catalog_movie(key)
+    except exc.SQLAlchemyError as e:
+        print(f"Impossible to read the movie catalog: {e}")
+        return None
+
+
+def save_catalog_movie(parsed_response):
+
+    """Stores a movie fetched from the API in the local catalog, so later lookups skip the network."""
+
+    entry = catalog_entry(parsed_response)
+    if entry is None or not has_app_context():
+        return
+    try:
+        data_manager.save_catalog_movies([entry])
+    except exc.SQLAlchemyError as e:
+        data_manager.db.session.rollback()
+        print(f"Impossible to save the movie to the catalog: {e}")
+
+
+def fresh_catalog_response(key, catalog_movie):
+
+    """Returns the OMDb response of a catalog movie younger than CATALOG_MAX_AGE and caches it,
+    or None if there is no such movie and the API has to be asked."""
 
-    endpoint = f"http://www.omdbapi.com/?apikey={API_KEY}&t={movie_input}"
-    response = requests.get(endpoint)
-    parsed_response = response.json()
+    if catalog_movie is None or datetime.now() - catalog_movie.fetched_at >= CATALOG_MAX_AGE:
+        return None
+    parsed_response = catalog_response(catalog_movie)
+    omdb_cache.set(key, parsed_response)
+    return parsed_response
+
+
+def stale_catalog_response(movie_input, catalog_movie, error):
+
+    """Falls back to an outdated catalog movie when the API call failed; re-raises the error without one."""
+
+    if catalog_movie is None:
+        raise error
+    print(f"Serving a stale catalog entry for {movie_input}: {error}")
+    return catalog_response(catalog_movie)
+
+
+def cache_api_response(key, parsed_response):
+
+    """Caches an API response: found movies for OMDB_CACHE_TTL, "Movie not found!" for OMDB_NEGATIVE_CACHE_TTL.
+    Returns True if the movie was found and belongs in the catalog."""
+
+    if parsed_response.get('Response') == 'True':
+        omdb_cache.set(key, parsed_response)
+        return True
+    if parsed_response == MOVIE_NOT_FOUND:
+        omdb_cache.set(key, parsed_response, ttl=OMDB_NEGATIVE_CACHE_TTL)
+    return False
+
+
+def fetch_movie_api(movie_input):
+
+    """
+    Returns the parsed OMDb response for a movie title.
+    Responses are served from the OMDb cache when possible, then from the local movie catalog,
+    and only then from the API. Catalog movies older than CATALOG_MAX_AGE are refreshed from the API,
+    but still served if the API is unavailable. Found movies are cached for OMDB_CACHE_TTL
+    and "Movie not found!" answers for OMDB_NEGATIVE_CACHE_TTL. Other errors are never cached.
+    """
+
+    key = normalize_title(movie_input)
+    parsed_response = omdb_cache.get(key)
+    if parsed_response is not None:
+        return parsed_response
+
+    catalog_movie = get_catalog_movie(key)
+    parsed_response = fresh_catalog_response(key, catalog_movie)
+    if parsed_response is not None:
+        return parsed_response
+
+    try:
+        with track_dependency('omdb', record_timing):
+            response = omdb_client.get(OMDB_URL, params={'apikey': API_KEY, 't': movie_input})
+            parsed_response = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return stale_catalog_response(movie_input, catalog_movie, e)
+    if cache_api_response(key, parsed_response):
+        save_catalog_movie(parsed_response)
+    return parsed_response
+
+
+def run_in_app_context(func, *args, **kwargs):
+
+    """Runs a function inside an application context, so worker threads can use the catalog."""
+
+    with app.app_context():
+        return func(*args, **kwargs)
+
+
+def resolve_movie_api(movie_input):
+
+    """Fetches and normalizes movie data from the OMDb API for a given movie input.
+    Does not touch the database, so it can run on worker threads."""
+
+    parsed_response = fetch_movie_api(movie_input)
     validate_response(parsed_response)
     title = parsed_response['Title']
-    validate_title_api(title, user_id)
+    if not title or title == 'N/A':
+        raise ValueError('Impossible to add the movie!')
     year = parsed_response['Year']
     year = validate_year_api(year)
     rating = parsed_response['imdbRating']
@@ -303,15 +582,30 @@ def get_data_api(movie_input, user_id):
 
 
 @validate_data_api
-def get_data_api_chat(movie_input):
+def get_data_api(movie_input, user_id):
 
-    """Fetches the movie poster from the OMDb API for a given movie input,
-    intended for chat-based recommendations."""
+    """Fetches and processes movie data from the OMDb API for a given movie input and user ID,
+    ensuring the movie exists and is not already added."""
+
+    title, year, rating, poster, director = resolve_movie_api(movie_input)
+    validate_title_api(title, user_id)
+    return title, year, rating, poster, director
+
+
+def fetch_poster_api(movie_input):
+
+    """Fetches the movie poster from the OMDb API for a given movie input.
+    Raises the same errors as the API call itself, so it can run outside of a request."""
 
-    endpoint = f"http://www.omdbapi.com/?apikey={API_KEY}&t={movie_input}"
-    response = requests.get(endpoint)
-    parsed_response = response.json()
-    if parsed_response == {"Response": "False", "Error": "Movie not found!"}:
+    return response_poster(fetch_movie_api(movie_input))
+
+
+def response_poster(parsed_response):
+
+    """Returns the poster URL of an OMDb response, or None if the movie has none.
+    Raises ValueError if the movie was not found."""
+
+    if parsed_response == MOVIE_NOT_FOUND:
         raise ValueError("Such movie doesn't exist!/hidden")
 
     poster = parsed_response['Poster']
@@ -321,17 +615,46 @@ def get_data_api_chat(movie_input):
     return poster
 
 
+@validate_data_api
+def get_data_api_chat(movie_input):
+
+    """Fetches the movie poster from the OMDb API for a given movie input,
+    intended for chat-based recommendations."""
+
+    return fetch_poster_api(movie_input)
+
+
 def get_rec_movies_with_poster(rec_movies):
 
-    """Enhances a list of recommended movies by fetching and appending poster data to each movie entry."""
+    """
+    Enhances a list of recommended movies by fetching and appending poster data to each movie entry.
+    Posters are fetched concurrently on the shared OMDb pool; movies keep their original order,
+    and lookups not finished within POSTER_DEADLINE seconds are dropped.
+    Returns the movies with posters and the error messages to show to the user.
+    """
 
+    futures = [omdb_executor.submit(run_in_app_context, fetch_poster_api, movie.get('title'))
+               for movie in rec_movies]
+    done, not_done = wait(futures, timeout=POSTER_DEADLINE)
+    for future in not_done:
+        future.cancel()
     rec_movies_with_poster = []
-    for movie in rec_movies:
-        poster = get_data_api_chat(movie.get('title'))
+    errors = []
+    for movie, future in zip(rec_movies, futures):
+        if future not in done:
+            print(f"Poster lookup exceeded the deadline: {movie.get('title')}")
+            continue
+        try:
+            poster = future.result()
+        except Exception as e:
+            message = api_error_message(e)
+            if message and message not in errors:
+                errors.append(message)
+            continue
         if poster:
             movie.update({'poster': poster})
             rec_movies_with_poster.append(movie)
-    return rec_movies_with_poster
+    return rec_movies_with_poster, errors
 
 
 def processing_add_movie(user_id):
@@ -345,29 +668,380 @@ def processing_add_movie(user_id):
             movie_to_add = get_data_api(title, user_id)
             if movie_to_add:
                 title, year, rating, poster, director = movie_to_add
-                data_manager.add_movie(title=title, year=year, rating=rating,
-                                       poster=poster, director=director, user_id=user_id)
+                try:
+                    data_manager.add_movie(title=title, year=year, rating=rating,
+                                           poster=poster, director=director, user_id=user_id)
+                except exc.IntegrityError as e:
+                    print(f"The following error has occurred: {e}")
+                    flash('The movie is already in the database.', 'error')
+                    return False
+                if poster:
+                    poster_executor.submit(poster_cache.prefetch, poster)
                 flash('Movie is successfully added.', 'info')
                 return True
 
 
-def process_recommendations_chat(user_id, chat):
+def recommendation_cache_key(user_id, movies, mood):
+
+    """Builds the recommendation cache key from the user ID, a fingerprint of the user's library and the normalized mood."""
+
+    library = json.dumps(sorted(movies)).encode('utf-8')
+    return str(user_id), hashlib.sha256(library).hexdigest(), normalize_title(mood or '')
+
+
+def process_recommendations_chat(user_id, contents, cache_key=None, library_titles=()):
 
-    """Processes chat-based movie recommendations by using the user's movies
-    and mood input to generate and enhance recommendations with poster data."""
+    """
+    Generates chat-based movie recommendations from the user's movies and mood in the user's stored chat session
+    and enhances them with poster data. Runs on the recommendation job workers,
+    so instead of flashing it returns the recommendations together with the error messages.
+    Titles already in library_titles are dropped, since the prompt may list only a part of a large library.
+    Successful results are stored in the recommendation cache under cache_key.
+    """
 
-    movies = data_manager.get_user_movies(user_id)
-    movies = [movie.title for movie in movies]
-    mood = request.form.get('mood')
-    contents = str([movies, mood])
-    recommendations = get_chat_ai_recommendations(chat, contents)
+    instructions = get_instructions(INSTRUCTIONS_PATH)
+    chat = chat_sessions.open(user_id, instructions) if instructions else None
+    if chat is None:
+        raise ValueError(f"No chat session for the user {user_id}")
+    with track_dependency('gemini', record_timing):
+        recommendations = get_chat_ai_recommendations(chat, contents)
+    chat_sessions.save(user_id, chat)
+    errors = []
     if recommendations:
-        recommendations = get_rec_movies_with_poster(recommendations)
+        owned = {normalize_title(title) for title in library_titles}
+        recommendations = [movie for movie in recommendations
+                           if normalize_title(str(movie.get('title'))) not in owned]
+        recommendations, errors = get_rec_movies_with_poster(recommendations)
     if not recommendations:
         recommendations = []
-        flash('Sorry, nothing was found. Try again!', 'error')
-    context = {'user_id': user_id, 'recommendations': recommendations}
-    return context
+        errors.append('Sorry, nothing was found. Try again!')
+    elif cache_key:
+        recommendation_cache.set(cache_key, recommendations)
+    return {'recommendations': recommendations, 'errors': errors}
+
+
+def sse_event(event, data):
+
+    """Formats a Server-Sent Event with a JSON payload."""
+
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class RecommendationStream:
+
+    """
+    Keeps the state of one recommendation event stream shared by the WSGI and ASGI versions:
+    recommendations for movies already in the library are skipped, every resolved poster lookup is turned
+    into events, each error message is sent once, and the finished stream caches its recommendations.
+    The callers only schedule the poster lookups.
+    """
+
+    def __init__(self, cache_key, library_titles):
+        self.cache_key = cache_key
+        self.owned = {normalize_title(title) for title in library_titles}
+        self.recommendations = []
+        self.errors = []
+
+
+    def wanted(self, movie):
+
+        """Checks if a recommended movie is not in the user's library yet."""
+
+        return normalize_title(str(movie.get('title'))) not in self.owned
+
+
+    def poster_found(self, movie, poster):
+
+        """Returns the events for a finished poster lookup; movies without a poster are left out."""
+
+        if not poster:
+            return []
+        movie.update({'poster': poster})
+        self.recommendations.append(movie)
+        return [sse_event('recommendation', movie)]
+
+
+    def poster_failed(self, error):
+
+        """Returns the events for a failed poster lookup, reporting every error message once."""
+
+        message = api_error_message(error)
+        if not message or message in self.errors:
+            return []
+        self.errors.append(message)
+        return [sse_event('error', {'message': message})]
+
+
+    def poster_timed_out(self, movie):
+        print(f"Poster lookup exceeded the deadline: {movie.get('title')}")
+        return []
+
+
+    def chat_failed(self, error):
+
+        """Returns the events for a failed Gemini response."""
+
+        print(f"The following error has occurred: {error}")
+        self.errors.append('Something went wrong, try again later.')
+        return [sse_event('error', {'message': self.errors[-1]})]
+
+
+    def finish(self):
+
+        """Caches the recommendations and returns the closing events."""
+
+        events = []
+        if self.recommendations:
+            recommendation_cache.set(self.cache_key, self.recommendations)
+        elif not self.errors:
+            events.append(sse_event('error', {'message': 'Sorry, nothing was found. Try again!'}))
+        events.append(sse_event('done', {}))
+        return events
+
+
+def stream_recommendations(user_id, chat, contents, cache_key, library_titles):
+
+    """
+    Streams chat-based movie recommendations as Server-Sent Events.
+    Every recommendation parsed from the streamed Gemini response gets its poster looked up on the shared OMDb pool
+    and is sent as a 'recommendation' event once the poster is resolved, in the original order.
+    Error messages are sent as 'error' events and the stream ends with a 'done' event.
+    """
+
+    stream = RecommendationStream(cache_key, library_titles)
+    pending = []
+
+    def resolve(movie, future, timeout):
+        try:
+            poster = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return stream.poster_timed_out(movie)
+        except Exception as e:
+            return stream.poster_failed(e)
+        return stream.poster_found(movie, poster)
+
+    try:
+        with track_dependency('gemini', record_timing):
+            for movie in stream_chat_ai_recommendations(chat, contents):
+                if not stream.wanted(movie):
+                    continue
+                pending.append((movie, omdb_executor.submit(run_in_app_context, fetch_poster_api,
+                                                            movie.get('title'))))
+                while pending and pending[0][1].done():
+                    yield from resolve(*pending.pop(0), timeout=0)
+        chat_sessions.save(user_id, chat)
+    except Exception as e:
+        yield from stream.chat_failed(e)
+    deadline = time.monotonic() + POSTER_DEADLINE
+    for movie, future in pending:
+        yield from resolve(movie, future, timeout=max(0, deadline - time.monotonic()))
+    yield from stream.finish()
+
+
+def parse_import_file(file):
+
+    """
+    Reads movie titles from an uploaded CSV or JSON file.
+    CSV files use the first column of every row (a 'title' header row is skipped);
+    JSON files contain a list of titles or of objects with a 'title' key.
+    Returns the list of titles or None with an appropriate flash message.
+    """
+
+    if not file or not file.filename:
+        flash('Choose a file to import!', 'error')
+        return None
+    try:
+        content = file.read().decode('utf-8-sig')
+        if file.filename.lower().endswith('.json'):
+            items = json.loads(content)
+            titles = [item.get('title') if isinstance(item, dict) else item for item in items]
+        else:
+            titles = [row[0] for row in csv.reader(io.StringIO(content)) if row]
+            if titles and titles[0].strip().lower() == 'title':
+                titles = titles[1:]
+    except (ValueError, TypeError, AttributeError, csv.Error) as e:
+        print(f"Impossible to read the import file: {e}")
+        flash('Wrong format of the file! Upload a CSV or JSON list of titles.', 'error')
+        return None
+    titles = [str(title).strip() for title in titles if title and str(title).strip()]
+    if not titles:
+        flash('The file contains no titles!', 'error')
+        return None
+    if len(titles) > MAX_IMPORT_TITLES:
+        flash(f"Maximum {MAX_IMPORT_TITLES} titles can be imported at once!", 'error')
+        return None
+    return titles
+
+
+def processing_import_movies(user_id, titles):
+
+    """
+    Imports a list of titles into a user's library.
+    Existing titles are loaded with one query, OMDb lookups run concurrently on the shared OMDb pool,
+    and all accepted movies are inserted in a single transaction. Titles are compared by their normalized key,
+    like movie_in_database does. If the transaction is rejected because the library changed meanwhile,
+    the movies are added one by one and the rejected ones are reported.
+    Returns a per-title list of results with the status and message of every title.
+    """
+
+    existing_titles = {normalize_title(title) for title in data_manager.get_user_movie_titles(user_id)}
+    futures = [omdb_executor.submit(run_in_app_context, resolve_movie_api, title) for title in titles]
+    results = []
+    movies_to_add = []
+    for title, future in zip(titles, futures):
+        result = {'input': title, 'title': title, 'status': 'error'}
+        try:
+            movie_title, year, rating, poster, director = future.result()
+        except Exception as e:
+            result['message'] = api_error_message(e) or "Such movie doesn't exist!"
+            results.append(result)
+            continue
+        result['title'] = movie_title
+        if normalize_title(movie_title) in existing_titles:
+            result['message'] = 'The movie is already in the database.'
+        else:
+            existing_titles.add(normalize_title(movie_title))
+            movies_to_add.append(({'title': movie_title, 'director': director, 'year': year,
+                                   'rating': rating, 'poster': poster}, result))
+            result.update({'status': 'added', 'message': 'Movie is successfully added.'})
+        results.append(result)
+    try:
+        data_manager.add_movies(user_id, [movie for movie, _ in movies_to_add])
+    except exc.IntegrityError:
+        for movie, result in movies_to_add:
+            try:
+                data_manager.add_movie(movie['title'], user_id, movie['director'], movie['year'],
+                                       movie['rating'], movie['poster'])
+            except exc.IntegrityError:
+                result.update({'status': 'error', 'message': 'The movie is already in the database.'})
+    added = [movie for movie, result in movies_to_add if result['status'] == 'added']
+    for movie in added:
+        if movie['poster']:
+            poster_executor.submit(poster_cache.prefetch, movie['poster'])
+    flash(f"{len(added)} of {len(titles)} movies are successfully imported.", 'info')
+    return results
+
+
+def get_page_size():
+
+    """Returns the page size requested with the 'limit' query parameter, bounded by MAX_PAGE_SIZE."""
+
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def get_movie_filters():
+
+    """
+    Reads the sort and filter query parameters of a movie list.
+    Unknown sort keys fall back to the title; invalid years are ignored with an appropriate flash message.
+    """
+
+    sort = request.args.get('sort', 'title')
+    if sort not in MOVIE_SORT_KEYS:
+        sort = 'title'
+    filters = {'sort': sort, 'descending': request.args.get('order') == 'desc',
+               'director': (request.args.get('director') or '').strip() or None}
+    for name in ('year_from', 'year_to'):
+        year = request.args.get(name)
+        filters[name] = None
+        if year and validate_year(year):
+            filters[name] = int(year)
+    return filters
+
+
+def page_url(endpoint, cursor, **values):
+
+    """Builds the URL of another page of the current listing, keeping its sort and filter parameters."""
+
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(endpoint, **values, **args)
+
+
+def load_page(get_page, *args, **kwargs):
+
+    """
+    Loads a page of a listing starting at the cursor from the query string.
+    Falls back to the first page with an appropriate flash message if the cursor is invalid.
+    """
+
+    try:
+        return get_page(*args, cursor=request.args.get('cursor'), **kwargs)
+    except ValueError as e:
+        print(f"Wrong page cursor: {e}")
+        flash('The page was not found, showing the first page.', 'error')
+        return get_page(*args, **kwargs)
+
+
+def page_etag(key):
+
+    """Returns the ETag of the page identified by key."""
+
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def client_has_page(etag, last_modified):
+
+    """Checks if the client has the current page already, by its ETag, or by Last-Modified when it sent no ETag."""
+
+    return bool(request.if_none_match.contains(etag)
+                or (not request.if_none_match and last_modified and request.if_modified_since
+                    and last_modified.astimezone().replace(microsecond=0) <= request.if_modified_since))
+
+
+def set_validators(response, etag, last_modified):
+
+    """Sets the ETag and Last-Modified headers of a page, which clients must revalidate before reusing it."""
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.astimezone()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_page(key, last_modified, render):
+
+    """
+    Serves the page identified by key, which must include the data version and query parameters it depends on.
+    Answers 304 Not Modified if the client has the page already (by its ETag, or by Last-Modified without an ETag),
+    otherwise serves it from the page cache or calls render and caches the result.
+    Pages with pending flash messages are always rendered and never cached, since flashes are shown only once.
+    """
+
+    etag = page_etag(key)
+    flashed = bool(session.get('_flashes'))
+    if not flashed and client_has_page(etag, last_modified):
+        response = Response(status=304)
+    else:
+        html = None if flashed else page_cache.get(key)
+        if html is None:
+            html = render()
+            flashed = bool(get_flashed_messages())
+            if not flashed:
+                page_cache.set(key, html)
+        response = make_response(html)
+    if flashed:
+        response.cache_control.no_store = True
+        return response
+    return set_validators(response, etag, last_modified)
+
+
+@app.template_global()
+def poster_url(movie, size='medium'):
+
+    """Builds the URL of a library movie's poster served from the local poster cache.
+    The URL carries a hash of the poster address, so it changes whenever the poster does."""
+
+    version = hashlib.sha1(movie.poster.encode('utf-8')).hexdigest()[:12]
+    return url_for('movie_poster', movie_id=movie.id, size=size, v=version)
 
 
 @app.errorhandler(exc.OperationalError)
@@ -380,6 +1054,14 @@ def operational_error(e):
     return render_template('error.html'), 500
 
 
+@app.get('/metrics')
+def metrics():
+
+    """Exposes request, dependency, SQL and cache metrics in the Prometheus text format."""
+
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 @app.get('/')
 def home():
 
@@ -392,22 +1074,102 @@ def home():
 @db_connection_handler
 def list_all_users():
 
-    """Retrieves all users from the database and renders the users list page."""
+    """Retrieves a page of users from the database and renders the users list page,
+    answering with 304 Not Modified or a cached copy while no user was added, renamed or deleted."""
+
+    def render():
+        users, next_cursor = load_page(data_manager.get_users_page, get_page_size())
+        context = {
+            'users': users,
+            'next_url': page_url('list_all_users', next_cursor) if next_cursor else None,
+            'first_url': page_url('list_all_users', None) if request.args.get('cursor') else None
+        }
+        return render_template('users.html', **context)
 
-    users = data_manager.get_all_users()
-    return render_template('users.html', users=users)
+    version = tuple(data_manager.get_users_version())
+    return cached_page(('list_all_users', None, version, tuple(sorted(request.args.items(multi=True)))), None, render)
 
 
-@app.get('/users/<user_id>/')
+@app.get('/users/<int:user_id>/')
 @db_connection_handler
 def user_movies(user_id):
 
-    """Displays the movies associated with a specific user by rendering the user's movies page."""
-    movies = data_manager.get_user_movies(user_id)
-    return render_template('user_movies.html', movies=movies)
+    """Displays a page of the movies associated with a specific user, sorted and filtered
+    by the query parameters, by rendering the user's movies page.
+    The user's library version drives the ETag and the page cache, so unchanged pages are not queried or rendered."""
+
+    filters = get_movie_filters()
+
+    def render():
+        movies, next_cursor = load_page(data_manager.get_user_movies_page, user_id, get_page_size(), **filters)
+        context = {
+            'movies': movies,
+            'user_id': user_id,
+            'filters': filters,
+            'next_url': page_url('user_movies', next_cursor, user_id=user_id) if next_cursor else None,
+            'first_url': page_url('user_movies', None, user_id=user_id) if request.args.get('cursor') else None
+        }
+        return render_template('user_movies.html', **context)
+
+    version = data_manager.get_library_version(user_id)
+    key = ('user_movies', user_id, tuple(version) if version else None, tuple(sorted(request.args.items(multi=True))))
+    return cached_page(key, version.updated_at if version else None, render)
+
+
+@app.get('/posters/<int:movie_id>')
+@db_connection_handler
+def movie_poster(movie_id):
 
+    """
+    Serves the poster of a library movie from the local poster cache in the requested size
+    with a content ETag and immutable caching headers.
+    Falls back to redirecting to the original poster if it cannot be cached,
+    unless the poster was refused (not a public http(s) URL or an oversized image).
+    """
 
-@app.post('/delete_user/<user_id>')
+    movie = data_manager.get_movie_by_id(movie_id)
+    if movie is None or not movie.poster:
+        return render_template('error.html'), 404
+    size = request.args.get('size', 'medium')
+    if size not in POSTER_SIZES:
+        size = 'medium'
+    try:
+        path, digest = poster_cache.get(movie.poster, size)
+    except PosterError as e:
+        print(f"The poster {movie.poster} is refused: {e}")
+        return render_template('error.html'), 404
+    except Exception as e:
+        print(f"Impossible to cache the poster {movie.poster}: {e}")
+        return redirect(movie.poster)
+    response = send_file(path, mimetype='image/jpeg', etag=f"{digest}-{size}", max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.get('/search')
+@db_connection_handler
+def search_all_movies():
+
+    """Searches the movies of all users by title and director and renders the search results page."""
+
+    query = request.args.get('q', '').strip()
+    movies = data_manager.search_movies(query, limit=SEARCH_LIMIT) if query else []
+    return render_template('search.html', movies=movies, query=query, user_id=None)
+
+
+@app.get('/users/<int:user_id>/search')
+@db_connection_handler
+def search_user_movies(user_id):
+
+    """Searches a user's movies by title and director and renders the search results page."""
+
+    query = request.args.get('q', '').strip()
+    movies = data_manager.search_movies(query, user_id=user_id, limit=SEARCH_LIMIT) if query else []
+    return render_template('search.html', movies=movies, query=query, user_id=user_id)
+
+
+@app.post('/delete_user/<int:user_id>')
 @db_connection_handler
 def delete_user_from_db(user_id):
 
@@ -433,7 +1195,7 @@ def add_user_to_db():
     return render_template('add_user.html')
 
 
-@app.route('/users/<user_id>/add_movie', methods=['GET', 'POST'])
+@app.route('/users/<int:user_id>/add_movie', methods=['GET', 'POST'])
 @db_connection_handler
 def add_movie_to_db(user_id):
 
@@ -447,7 +1209,7 @@ def add_movie_to_db(user_id):
     return render_template('add_movie.html', user_id=user_id)
 
 
-@app.route('/users/<user_id>/add_movie_rec', methods=['GET', 'POST'])
+@app.route('/users/<int:user_id>/add_movie_rec', methods=['GET', 'POST'])
 @db_connection_handler
 def add_rec_movie_to_db(user_id):
 
@@ -458,7 +1220,22 @@ def add_rec_movie_to_db(user_id):
     return redirect(url_for('user_movies', user_id=user_id))
 
 
-@app.route('/users/<user_id>/update_movie/<movie_id>', methods=['GET', 'POST'])
+@app.route('/users/<int:user_id>/import_movies', methods=['GET', 'POST'])
+@db_connection_handler
+def import_movies_to_db(user_id):
+
+    """Handles bulk imports of movies from an uploaded CSV or JSON list of titles
+    and renders the import page with the result of every title."""
+
+    results = None
+    if request.method == 'POST':
+        titles = parse_import_file(request.files.get('file'))
+        if titles:
+            results = processing_import_movies(user_id, titles)
+    return render_template('import_movies.html', user_id=user_id, results=results)
+
+
+@app.route('/users/<int:user_id>/update_movie/<int:movie_id>', methods=['GET', 'POST'])
 @db_connection_handler
 def update_movie_in_db(user_id, movie_id):
 
@@ -476,15 +1253,19 @@ def update_movie_in_db(user_id, movie_id):
             title, director, year, rating, poster = movie_to_update
             print(year)
             print(rating)
-            data_manager.update_movie(movie_id=movie_id, title=title, director=director,
-                                      year=year, rating=rating, poster=poster)
-            flash('Movie is successfully updated.', 'info')
+            try:
+                data_manager.update_movie(movie_id=movie_id, title=title, director=director,
+                                          year=year, rating=rating, poster=poster)
+                flash('Movie is successfully updated.', 'info')
+            except exc.IntegrityError as e:
+                print(f"The following error has occurred: {e}")
+                flash('The movie is already in the database.', 'error')
     movie = data_manager.get_movie_by_id(movie_id)
     context = {'movie': movie, 'user_id': user_id}
     return render_template('update_movie.html', **context)
 
 
-@app.post('/users/<user_id>/delete_movie/<movie_id>')
+@app.post('/users/<int:user_id>/delete_movie/<int:movie_id>')
 @db_connection_handler
 def delete_movie_from_db(user_id, movie_id):
 
@@ -496,36 +1277,624 @@ def delete_movie_from_db(user_id, movie_id):
     return redirect(url_for('user_movies', user_id=user_id))
 
 
-@app.route('/users/<user_id>/get_recommendations', methods=['GET', 'POST'])
+@app.route('/users/<int:user_id>/get_recommendations', methods=['GET', 'POST'])
 @db_connection_handler
 def ai_recommendations(user_id):
 
-    """Handles AI movie recommendation requests by generating recommendations
-    based on user movie data and chat input, then rendering the recommendations page."""
+    """Handles AI movie recommendation requests: GET starts a new chat session and renders the mood page,
+    POST answers from the recommendation cache when the library and mood are unchanged (unless a refresh is requested),
+    otherwise queues a recommendation job for the user's movies and mood and redirects to its progress page,
+    or to the streaming page when STREAM_RECOMMENDATIONS is enabled."""
 
     if request.method == 'GET':
-        instructions = get_instructions('genai/instructions.txt')
+        instructions = get_instructions(INSTRUCTIONS_PATH)
         if not instructions:
             flash('Something went wrong. Try again later!', 'error')
             return redirect(url_for('user_movies', user_id=user_id))
-        chat = open_chat(instructions)
-        users_chats.update({user_id:chat})
+        chat_sessions.reset(user_id)
         return render_template('recommendations.html', user_id=user_id)
     if request.method == 'POST':
-        movies = data_manager.get_user_movies(user_id)
-        movies = [movie.title for movie in movies]
+        library = list(data_manager.get_user_movies(user_id))
+        movies = [movie.title for movie in library]
         mood = request.form.get('mood')
-        contents = str([movies, mood])
-        chat = users_chats.get(user_id)
-        chat.get_history()
-        recommendations = get_chat_ai_recommendations(chat, contents)
-        if recommendations:
-            recommendations = get_rec_movies_with_poster(recommendations)
-        if not recommendations:
-            recommendations = []
-            flash('Sorry, nothing was found. Try again!', 'error')
-        context = {'user_id': user_id, 'recommendations': recommendations, 'mood': mood}
-        return render_template('recommended_movies.html', **context)
+        cache_key = recommendation_cache_key(user_id, movies, mood)
+        if not request.form.get('refresh'):
+            recommendations = recommendation_cache.get(cache_key)
+            if recommendations:
+                context = {'user_id': user_id, 'recommendations': recommendations, 'mood': mood}
+                return render_template('recommended_movies.html', **context)
+        if not chat_sessions.exists(user_id):
+            return redirect(url_for('ai_recommendations', user_id=user_id))
+        if STREAM_RECOMMENDATIONS:
+            return redirect(url_for('recommendations_stream', user_id=user_id, mood=mood))
+        contents, tokens, listed = summarize_library(library, mood, PROMPT_TOKEN_BUDGET)
+        print(f"Recommendation prompt for user {user_id}: ~{tokens} tokens, {listed} of {len(movies)} titles listed")
+        try:
+            job_id = recommendation_jobs.submit(process_recommendations_chat, user_id, contents, cache_key, movies,
+                                                owner=user_id)
+        except QueueFullError as e:
+            print(f"Recommendation queue is full: {e}")
+            flash('Too many requests at the moment, try again later.', 'error')
+            return render_template('recommendations.html', user_id=user_id)
+        return redirect(url_for('recommendation_job', user_id=user_id, job_id=job_id, mood=mood))
+
+
+@app.get('/users/<int:user_id>/recommendations/<job_id>')
+@db_connection_handler
+def recommendation_job(user_id, job_id):
+
+    """Shows the progress of a recommendation job: a self-refreshing waiting page while it runs,
+    then the recommended movies once it is finished."""
+
+    job = recommendation_jobs.get(job_id, owner=user_id)
+    if job is None or job.status == 'failed':
+        flash('Something went wrong. Try again!', 'error')
+        return redirect(url_for('ai_recommendations', user_id=user_id))
+    context = {'user_id': user_id, 'mood': request.args.get('mood'), 'poll_interval': JOB_POLL_INTERVAL}
+    if not job.finished:
+        return render_template('recommendations_pending.html', **context)
+    for message in job.result['errors']:
+        flash(message, 'error')
+    context['recommendations'] = job.result['recommendations']
+    return render_template('recommended_movies.html', **context)
+
+
+@app.get('/users/<int:user_id>/recommendations/<job_id>/status')
+def recommendation_job_status(user_id, job_id):
+
+    """Returns the state of a recommendation job as JSON for clients polling for its result."""
+
+    job = recommendation_jobs.get(job_id, owner=user_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.as_dict())
+
+
+@app.get('/users/<int:user_id>/recommendations/stream')
+def recommendations_stream(user_id):
+
+    """Renders the page that shows recommendations one by one as they are streamed."""
+
+    return render_template('recommendations_stream.html', user_id=user_id, mood=request.args.get('mood'))
+
+
+@app.get('/users/<int:user_id>/recommendations/events')
+@db_connection_handler
+def recommendation_events(user_id):
+
+    """Generates recommendations for the user's movies and mood and streams them as Server-Sent Events."""
+
+    library = list(data_manager.get_user_movies(user_id))
+    movies = [movie.title for movie in library]
+    mood = request.args.get('mood')
+    instructions = get_instructions(INSTRUCTIONS_PATH)
+    chat = chat_sessions.open(user_id, instructions) if instructions else None
+    if chat is None:
+        events = [sse_event('error', {'message': 'Something went wrong. Try again!'}), sse_event('done', {})]
+    else:
+        contents, tokens, listed = summarize_library(library, mood, PROMPT_TOKEN_BUDGET)
+        print(f"Recommendation prompt for user {user_id}: ~{tokens} tokens, {listed} of {len(movies)} titles listed")
+        events = stream_with_context(stream_recommendations(user_id, chat, contents,
+                                                            recommendation_cache_key(user_id, movies, mood), movies))
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache',
+                                                                   'X-Accel-Buffering': 'no'})
+
+
+class APIError(Exception):
+
+    """Error of an API request, answered with a JSON body and the given status code."""
+
+    def __init__(self, message, status=400, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.errors = errors
+
+
+def api_error(message, status, errors=None):
+
+    """Builds the JSON error response of the API, with the validation messages of every invalid field if any."""
+
+    body = {'error': message}
+    if errors:
+        body['errors'] = errors
+    return jsonify(body), status
+
+
+def api_handler(func):
+
+    """
+    Decorator for API routes: answers APIError with its JSON error response,
+    and database and unexpected errors with a JSON 500 response instead of the HTML error page.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except APIError as e:
+            return api_error(e.message, e.status, e.errors)
+        except (exc.OperationalError, exc.ArgumentError) as e:
+            print(f'The following error has occurred: {e}')
+            return api_error('Problem with database, try again later.', 500)
+        except Exception as e:
+            print(f'The following error has occurred: {e}')
+            return api_error('Something went wrong, try again later.', 500)
+    return wrapper
+
+
+def api_fields(allowed):
+
+    """Reads the comma-separated 'fields' query parameter and returns the selected fields, all of them by default.
+    Raises APIError if a field is unknown."""
+
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    fields = tuple(dict.fromkeys(field.strip() for field in requested.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise APIError(f"Unknown fields! Choose from: {', '.join(allowed)}.")
+    return fields
+
+
+def movie_filter_errors():
+
+    """Returns the messages of invalid sort, order and year query parameters of a movie list,
+    which the HTML pages replace with defaults instead."""
+
+    errors = []
+    if request.args.get('sort', 'title') not in MOVIE_SORT_KEYS:
+        errors.append(f"sort: Choose from: {', '.join(MOVIE_SORT_KEYS)}.")
+    if request.args.get('order', 'asc') not in ('asc', 'desc'):
+        errors.append('order: Choose from: asc, desc.')
+    for name in ('year_from', 'year_to'):
+        error = year_error(request.args.get(name))
+        if error:
+            errors.append(f"{name}: {error}")
+    return errors
+
+
+def cached_json(key, last_modified, load):
+
+    """
+    JSON counterpart of cached_page for the API: answers 304 Not Modified if the client has the document already,
+    otherwise serves it from the page cache or calls load and caches the serialized result.
+    """
+
+    etag = page_etag(key)
+    if client_has_page(etag, last_modified):
+        response = Response(status=304)
+    else:
+        body = page_cache.get(key)
+        if body is None:
+            body = json.dumps(load())
+            page_cache.set(key, body)
+        response = Response(body, mimetype='application/json')
+    return set_validators(response, etag, last_modified)
+
+
+def require_user(user_id):
+
+    """Returns the library version of an existing user. Raises APIError if there is no such user."""
+
+    version = data_manager.get_library_version(user_id)
+    if version is None:
+        raise APIError('The user was not found.', 404)
+    return version
+
+
+def read_batch(key):
+
+    """Returns the non-empty list stored under key in the JSON body of a batch request.
+    Raises APIError if it is missing or longer than MAX_API_BATCH."""
+
+    data = request.get_json(silent=True)
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise APIError(f"Send a JSON object with a non-empty '{key}' list!")
+    if len(items) > MAX_API_BATCH:
+        raise APIError(f"Maximum {MAX_API_BATCH} items are allowed in a batch!", 413)
+    return items
+
+
+def batch_ids(ids):
+
+    """Checks that library entry IDs of a batch are distinct integers. Raises APIError otherwise."""
+
+    if any(not isinstance(movie_id, int) or isinstance(movie_id, bool) for movie_id in ids):
+        raise APIError('Movie IDs must be integers!')
+    if len(set(ids)) != len(ids):
+        raise APIError('Every movie may appear only once in a batch!')
+    return ids
+
+
+def api_movie_data(item, partial=False):
+
+    """
+    Validates a movie object of an API request with the same checks as the forms and returns the data
+    with empty fields converted to None, the year to an integer and the rating to a number, and the error messages.
+    With partial only the fields present in the object are validated and returned.
+    """
+
+    if not isinstance(item, dict):
+        return None, ['Every movie must be a JSON object!']
+    data, errors = {}, []
+    for field, field_error in MOVIE_FIELD_ERRORS.items():
+        if partial and field not in item:
+            continue
+        value = item.get(field)
+        text_field = field in ('title', 'director', 'poster')
+        if isinstance(value, (bool, list, dict)) or (text_field and value is not None and not isinstance(value, str)):
+            error = 'Wrong format!'
+        else:
+            error = field_error(value)
+        if error:
+            errors.append(f"{field}: {error}")
+        elif value in (None, ''):
+            data[field] = None
+        else:
+            data[field] = value if text_field else int(value) if field == 'year' else float(value)
+    return data, errors
+
+
+def validate_batch(items, partial=False):
+
+    """Validates every movie of a batch and returns their data. Raises APIError listing the invalid fields
+    of every movie by its position in the batch, so nothing is written unless the whole batch is valid."""
+
+    movies, errors = [], []
+    for index, item in enumerate(items):
+        data, item_errors = api_movie_data(item, partial)
+        movies.append(data)
+        errors += [f"[{index}] {error}" for error in item_errors]
+    if errors:
+        raise APIError('Invalid movie data!', 400, errors)
+    return movies
+
+
+@app.get('/api/v1/users')
+@api_handler
+def api_list_users():
+
+    """
+    Returns a page of users as JSON with the cursor of the next page ('limit', 'cursor' and 'fields' parameters).
+    Answers If-None-Match with 304 Not Modified while no user was added, renamed or deleted.
+    """
+
+    fields = api_fields(USER_FIELDS)
+
+    def load():
+        users, next_cursor = data_manager.get_users_page(get_page_size(), cursor=request.args.get('cursor'))
+        return {'users': [{field: getattr(user, field) for field in fields} for user in users],
+                'next_cursor': next_cursor}
+
+    version = tuple(data_manager.get_users_version())
+    try:
+        return cached_json(('api_list_users', None, version, tuple(sorted(request.args.items(multi=True)))), None,
+                           load)
+    except ValueError as e:
+        print(f"Wrong page cursor: {e}")
+        raise APIError('Wrong page cursor!')
+
+
+@app.post('/api/v1/users')
+@api_handler
+def api_add_user():
+
+    """Adds a user from a JSON object with a 'name', validated like the form, and returns it with status 201."""
+
+    data = request.get_json(silent=True)
+    name = data.get('name') if isinstance(data, dict) else None
+    if name is not None and not isinstance(name, str):
+        raise APIError('Wrong format!')
+    error = username_error(name)
+    if error:
+        raise APIError(error, 409 if name and data_manager.user_in_database(name) else 400)
+    try:
+        user_id = data_manager.add_user(name)
+    except exc.IntegrityError as e:
+        data_manager.db.session.rollback()
+        print(f"The following error has occurred: {e}")
+        raise APIError('User is already existed. Choose another name.', 409)
+    return jsonify({'id': user_id, 'name': name}), 201, {'Location': url_for('api_user_movies', user_id=user_id)}
+
+
+@app.get('/api/v1/users/<int:user_id>/movies')
+@api_handler
+def api_user_movies(user_id):
+
+    """
+    Returns a page of a user's movies as JSON with the cursor of the next page, sorted and filtered like the
+    library page ('sort', 'order', 'director', 'year_from', 'year_to', 'limit', 'cursor' and 'fields' parameters).
+    The user's library version drives the ETag, so unchanged libraries are answered with 304 Not Modified.
+    """
+
+    fields = api_fields(MOVIE_FIELDS)
+    errors = movie_filter_errors()
+    if errors:
+        raise APIError('Invalid query parameters!', 400, errors)
+    version = require_user(user_id)
+    filters = get_movie_filters()
+
+    def load():
+        movies, next_cursor = data_manager.get_user_movies_page(user_id, get_page_size(),
+                                                                 cursor=request.args.get('cursor'), **filters)
+        return {'movies': [{field: getattr(movie, field) for field in fields} for movie in movies],
+                'next_cursor': next_cursor}
+
+    key = ('api_user_movies', user_id, tuple(version), tuple(sorted(request.args.items(multi=True))))
+    try:
+        return cached_json(key, version.updated_at, load)
+    except ValueError as e:
+        print(f"Wrong page cursor: {e}")
+        raise APIError('Wrong page cursor!')
+
+
+@app.post('/api/v1/users/<int:user_id>/movies')
+@api_handler
+def api_add_movies(user_id):
+
+    """
+    Adds a batch of movies ({"movies": [{"title", "director", "year", "rating", "poster"}, ...]}) to a user's library
+    in a single transaction. The data is stored as sent, validated like the update form, without OMDb lookups.
+    Returns the IDs of the new library entries in the order of the batch with status 201; nothing is added
+    if any movie is invalid or already in the library. Titles are compared by their normalized key,
+    like movie_in_database does.
+    """
+
+    require_user(user_id)
+    movies = validate_batch(read_batch('movies'))
+    existing_titles = {normalize_title(title) for title in data_manager.get_user_movie_titles(user_id)}
+    errors = []
+    for index, movie in enumerate(movies):
+        title_key = normalize_title(movie['title'])
+        if title_key in existing_titles:
+            errors.append(f"[{index}] The movie is already in the database.")
+        existing_titles.add(title_key)
+    if errors:
+        raise APIError('The movie is already in the database.', 409, errors)
+    try:
+        ids = data_manager.add_movies(user_id, movies)
+    except exc.IntegrityError as e:
+        print(f"The following error has occurred: {e}")
+        raise APIError('The movie is already in the database.', 409)
+    for movie in movies:
+        if movie['poster']:
+            poster_executor.submit(poster_cache.prefetch, movie['poster'])
+    return jsonify({'ids': ids}), 201
+
+
+@app.patch('/api/v1/users/<int:user_id>/movies')
+@api_handler
+def api_update_movies(user_id):
+
+    """
+    Updates a batch of a user's movies ({"movies": [{"id", and any of "title", "director", "year", "rating",
+    "poster"}, ...]}) in a single transaction; fields left out keep their values. Nothing is updated
+    if any movie is invalid, not in the user's library, or would duplicate another movie of the library.
+    """
+
+    require_user(user_id)
+    items = read_batch('movies')
+    batch_ids([item.get('id') if isinstance(item, dict) else None for item in items])
+    updates = [dict(data, id=item['id']) for item, data in zip(items, validate_batch(items, partial=True))]
+    try:
+        data_manager.update_movies(user_id, updates)
+    except ValueError as e:
+        raise APIError(str(e), 404)
+    except exc.IntegrityError as e:
+        print(f"The following error has occurred: {e}")
+        raise APIError('The movie is already in the database.', 409)
+    return jsonify({'ids': [update['id'] for update in updates]})
+
+
+@app.delete('/api/v1/users/<int:user_id>/movies')
+@api_handler
+def api_delete_movies(user_id):
+
+    """Deletes a batch of a user's movies ({"ids": [...]}) in a single transaction.
+    Nothing is deleted if any of them is not in the user's library."""
+
+    require_user(user_id)
+    ids = batch_ids(read_batch('ids'))
+    try:
+        data_manager.delete_movies(user_id, ids)
+    except ValueError as e:
+        raise APIError(str(e), 404)
+    return jsonify({'ids': ids})
+
+
+def import_library_rows(rows, user_id=None):
+
+    """
+    Imports the rows of a library export, validated like the JSON API, in batches of LIBRARY_IMPORT_BATCH movies
+    written through add_movies; movies already in the library are skipped and invalid rows are logged.
+    Without user_id every movie goes to the user named in its 'user' column, who is added if missing.
+    Returns the numbers of added, skipped and invalid rows.
+    """
+
+    counts = {'added': 0, 'skipped': 0, 'invalid': 0}
+    users = None if user_id is not None else {user.name: user.id for user in data_manager.get_all_users()}
+    batch, batch_user = [], user_id
+
+    def flush():
+        if batch:
+            added = len(data_manager.add_movies(batch_user, batch, skip_existing=True))
+            counts['added'] += added
+            counts['skipped'] += len(batch) - added
+            batch.clear()
+
+    for number, row in rows:
+        data, errors = api_movie_data(row)
+        owner = user_id
+        if not errors and users is not None:
+            name = row.get('user')
+            owner = users.get(name)
+            if owner is None:
+                error = username_error(name) if isinstance(name, str) else 'Name must not be blank!'
+                if error:
+                    errors = [f"user: {error}"]
+                else:
+                    owner = users[name] = data_manager.add_user(name)
+        if errors:
+            print(f"Line {number} is not imported: {'; '.join(errors)}")
+            counts['invalid'] += 1
+            continue
+        if owner != batch_user:
+            flush()
+            batch_user = owner
+        batch.append(data)
+        if len(batch) >= LIBRARY_IMPORT_BATCH:
+            flush()
+    flush()
+    return counts
+
+
+def library_export_response(user_id, name):
+
+    """Streams the movies of one user, or of all users, as a download in the format of the 'format' query parameter
+    (CSV by default), generated chunk by chunk while the rows are read from the database."""
+
+    file_format = request.args.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        file_format = 'csv'
+    chunks = stream_with_context(export_chunks(data_manager.stream_library(user_id), file_format))
+    return Response(chunks, mimetype=EXPORT_FORMATS[file_format],
+                    headers={'Content-Disposition': f'attachment; filename="{name}.{file_format}"'})
+
+
+@app.get('/users/<int:user_id>/export')
+@db_connection_handler
+def export_user_library(user_id):
+
+    """Downloads a user's library as CSV or JSON Lines."""
+
+    if data_manager.get_library_version(user_id) is None:
+        return render_template('error.html'), 404
+    return library_export_response(user_id, f"library-{user_id}")
+
+
+@app.get('/export')
+@db_connection_handler
+def export_all_libraries():
+
+    """Downloads the libraries of all users as CSV or JSON Lines."""
+
+    return library_export_response(None, 'libraries')
+
+
+@app.post('/users/<int:user_id>/import_library')
+@db_connection_handler
+def import_library_to_db(user_id):
+
+    """Restores movies from an uploaded CSV or JSON Lines library export into the user's library,
+    reading the file line by line, and redirects to the user's movies page with the result."""
+
+    file = request.files.get('file')
+    file_format = export_format(file.filename) if file else None
+    if data_manager.get_library_version(user_id) is None:
+        return render_template('error.html'), 404
+    if file_format is None:
+        flash('Upload a CSV or JSON Lines library export!', 'error')
+        return redirect(url_for('import_movies_to_db', user_id=user_id))
+    try:
+        counts = import_library_rows(read_export(io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline=''),
+                                                 file_format), user_id)
+    except (ValueError, csv.Error) as e:
+        print(f"Impossible to read the library export: {e}")
+        flash('Wrong format of the file! Movies before the wrong line may have been imported.', 'error')
+        return redirect(url_for('user_movies', user_id=user_id))
+    flash(f"{counts['added']} movies are successfully imported, {counts['skipped']} were already in the library, "
+          f"{counts['invalid']} rows were invalid.", 'info')
+    return redirect(url_for('user_movies', user_id=user_id))
+
+
+@app.cli.command('init-db')
+def init_db():
+
+    """Creates the tables and the search index in an empty database, e.g. a new PostgreSQL database,
+    and marks it as up to date with the migrations."""
+
+    data_manager.db.create_all()
+    data_manager.rebuild_search_index()
+    stamp()
+    print('Database is initialized.')
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+
+    """Creates the full-text search index if needed and rebuilds it from the existing movies."""
+
+    data_manager.rebuild_search_index()
+    print('Search index is rebuilt.')
+
+
+@app.cli.command('load-catalog')
+@click.argument('path')
+def load_catalog(path):
+
+    """Preloads the local movie catalog from a dump with one OMDb JSON response per line."""
+
+    batch, loaded, skipped = [], 0, 0
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                entry = catalog_entry(json.loads(line))
+            except (ValueError, AttributeError):
+                entry = None
+            if entry is None:
+                skipped += 1
+                continue
+            batch.append(entry)
+            if len(batch) >= CATALOG_LOAD_BATCH:
+                data_manager.save_catalog_movies(batch)
+                loaded += len(batch)
+                batch = []
+    data_manager.save_catalog_movies(batch)
+    loaded += len(batch)
+    print(f"Loaded {loaded} movies into the catalog, skipped {skipped} lines.")
+
+
+@app.cli.command('export-library')
+@click.argument('path')
+@click.option('--user', 'user_id', type=int, help='ID of the user to export; all users by default.')
+@click.option('--format', 'file_format', type=click.Choice(sorted(EXPORT_FORMATS)),
+              help='Format of the file; by default from its extension, otherwise CSV.')
+def export_library(path, user_id, file_format):
+
+    """Writes the movies of one user or of all users to a CSV or JSON Lines file ('-' for standard output),
+    streaming them from the database."""
+
+    file_format = file_format or export_format(path) or 'csv'
+    with click.open_file(path, 'wb') as file:
+        for chunk in export_chunks(data_manager.stream_library(user_id), file_format):
+            file.write(chunk.encode('utf-8'))
+    click.echo(f"Libraries are exported to {path}.", err=True)
+
+
+@app.cli.command('import-library')
+@click.argument('path')
+@click.option('--user', 'user_id', type=int,
+              help='ID of the user to import into; by default the users named in the file, added if missing.')
+@click.option('--format', 'file_format', type=click.Choice(sorted(EXPORT_FORMATS)),
+              help='Format of the file; by default from its extension, otherwise CSV.')
+def import_library(path, user_id, file_format):
+
+    """Imports a CSV or JSON Lines library export ('-' for standard input) in batches of LIBRARY_IMPORT_BATCH
+    movies, skipping movies already in a library."""
+
+    if user_id is not None and data_manager.get_library_version(user_id) is None:
+        raise click.BadParameter(f"There is no user {user_id}.", param_hint='--user')
+    file_format = file_format or export_format(path) or 'csv'
+    with click.open_file(path, 'rb') as file:
+        counts = import_library_rows(read_export(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''),
+                                                 file_format), user_id)
+    print(f"Imported {counts['added']} movies, skipped {counts['skipped']} already in a library "
+          f"and {counts['invalid']} invalid rows.")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+"""
+ASGI entry point: uvicorn asgi:application
+
+The recommendation event stream, which waits on Gemini and OMDb for its whole lifetime, is served natively
+on the event loop with the asyncio data manager and API clients; every other route is served by the Flask app
+through the WSGI adapter on a pool of ASGI_WSGI_WORKERS threads. One process can therefore hold hundreds
+of open recommendation streams without a thread per stream.
+"""
+
+from app import (app, data_manager, omdb_cache, chat_backend, chat_sessions, recommendation_cache_key,
+                 catalog_entry, fresh_catalog_response, stale_catalog_response, cache_api_response, response_poster,
+                 RecommendationStream, sse_event, summarize_library, get_instructions, normalize_title, API_KEY,
+                 OMDB_URL, POSTER_DEADLINE, PROMPT_TOKEN_BUDGET, INSTRUCTIONS_PATH)
+from genai.chat_store import ChatSessionStore
+from genai.movies_rec_ai import open_async_chat, stream_chat_ai_recommendations_async
+from storage.async_data_manager import AsyncDataManager
+from storage.database import ASYNC_DATABASE_URL
+from network.async_http_client import AsyncHTTPClient
+from monitoring.metrics import track_dependency
+from a2wsgi import WSGIMiddleware
+from urllib.parse import parse_qs
+from sqlalchemy import exc
+import requests
+import asyncio
+import time
+import os
+import re
+
+async_data_manager = AsyncDataManager(ASYNC_DATABASE_URL, data_manager.db_path, user_model=data_manager.user_model,
+                                      entry_model=data_manager.entry_model, catalog_model=data_manager.catalog_model,
+                                      manager_class=type(data_manager), query_cache=data_manager.query_cache)
+for listener in data_manager.write_listeners:
+    async_data_manager.add_write_listener(listener)
+async_omdb_client = AsyncHTTPClient.from_env('OMDB')
+async_chat_sessions = ChatSessionStore(chat_backend, open_async_chat, idle_ttl=chat_sessions.idle_ttl,
+                                       max_history=chat_sessions.max_history)
+wsgi_application = WSGIMiddleware(app, workers=int(os.getenv('ASGI_WSGI_WORKERS', 10)))
+
+RECOMMENDATION_EVENTS = re.compile(r'^/users/(\d+)/recommendations/events$')
+catalog_queue = []
+catalog_writer = None
+
+
+async def get_catalog_movie_async(key):
+
+    """Asyncio version of get_catalog_movie, reading the catalog through the asyncio data manager."""
+
+    try:
+        return await async_data_manager.get_catalog_movie(key)
+    except exc.SQLAlchemyError as e:
+        print(f"Impossible to read the movie catalog: {e}")
+        return None
+
+
+async def save_catalog_movie_async(parsed_response):
+
+    """
+    Queues a movie fetched from the API for the local catalog, so later lookups skip the network.
+    Queued movies are written in batches by a single task: concurrent streams do not wait for each other
+    on the SQLite write lock, and the poster lookup never waits for the write.
+    """
+
+    global catalog_writer
+    entry = catalog_entry(parsed_response)
+    if entry is None:
+        return
+    catalog_queue.append(entry)
+    if catalog_writer is None or catalog_writer.done():
+        catalog_writer = asyncio.create_task(write_catalog_queue())
+
+
+async def write_catalog_queue():
+    while catalog_queue:
+        batch = catalog_queue[:]
+        del catalog_queue[:]
+        try:
+            await async_data_manager.save_catalog_movies(batch)
+        except exc.SQLAlchemyError as e:
+            print(f"Impossible to save {len(batch)} movies to the catalog: {e}")
+
+
+async def fetch_movie_api_async(movie_input):
+
+    """Asyncio version of fetch_movie_api: OMDb cache, then the local catalog, then the API."""
+
+    key = normalize_title(movie_input)
+    parsed_response = omdb_cache.get(key)
+    if parsed_response is not None:
+        return parsed_response
+
+    catalog_movie = await get_catalog_movie_async(key)
+    parsed_response = fresh_catalog_response(key, catalog_movie)
+    if parsed_response is not None:
+        return parsed_response
+
+    try:
+        with track_dependency('omdb'):
+            response = await async_omdb_client.get(OMDB_URL, params={'apikey': API_KEY, 't': movie_input})
+            parsed_response = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return stale_catalog_response(movie_input, catalog_movie, e)
+    if cache_api_response(key, parsed_response):
+        await save_catalog_movie_async(parsed_response)
+    return parsed_response
+
+
+async def fetch_poster_api_async(movie_input):
+
+    """Asyncio version of fetch_poster_api."""
+
+    return response_poster(await fetch_movie_api_async(movie_input))
+
+
+async def stream_recommendations_async(user_id, chat, contents, cache_key, library_titles):
+
+    """
+    Asyncio version of stream_recommendations: poster lookups run as tasks on the event loop
+    while the Gemini response is still streaming, and recommendations are sent in the original order.
+    """
+
+    stream = RecommendationStream(cache_key, library_titles)
+    pending = []
+
+    async def resolve(movie, task, timeout):
+        try:
+            poster = await asyncio.wait_for(task, timeout) if timeout else task.result()
+        except asyncio.TimeoutError:
+            return stream.poster_timed_out(movie)
+        except Exception as e:
+            return stream.poster_failed(e)
+        return stream.poster_found(movie, poster)
+
+    try:
+        with track_dependency('gemini'):
+            async for movie in stream_chat_ai_recommendations_async(chat, contents):
+                if not stream.wanted(movie):
+                    continue
+                pending.append((movie, asyncio.create_task(fetch_poster_api_async(movie.get('title')))))
+                while pending and pending[0][1].done():
+                    for event in await resolve(*pending.pop(0), timeout=0):
+                        yield event
+        async_chat_sessions.save(user_id, chat)
+    except Exception as e:
+        for event in stream.chat_failed(e):
+            yield event
+    deadline = time.monotonic() + POSTER_DEADLINE
+    for movie, task in pending:
+        for event in await resolve(movie, task, timeout=max(0.001, deadline - time.monotonic())):
+            yield event
+    for event in stream.finish():
+        yield event
+
+
+async def recommendation_events(user_id, mood):
+
+    """Generates recommendations for the user's movies and mood as Server-Sent Events."""
+
+    try:
+        library = await async_data_manager.get_user_movies(user_id)
+    except exc.SQLAlchemyError as e:
+        print(f"The following error has occurred: {e}")
+        yield sse_event('error', {'message': 'Problem with database, try again later.'})
+        yield sse_event('done', {})
+        return
+    movies = [movie.title for movie in library]
+    instructions = get_instructions(INSTRUCTIONS_PATH)
+    chat = async_chat_sessions.open(user_id, instructions) if instructions else None
+    if chat is None:
+        yield sse_event('error', {'message': 'Something went wrong. Try again!'})
+        yield sse_event('done', {})
+        return
+    contents, tokens, listed = summarize_library(library, mood, PROMPT_TOKEN_BUDGET)
+    print(f"Recommendation prompt for user {user_id}: ~{tokens} tokens, {listed} of {len(movies)} titles listed")
+    async for event in stream_recommendations_async(user_id, chat, contents,
+                                                    recommendation_cache_key(user_id, movies, mood), movies):
+        yield event
+
+
+async def serve_events(send, events):
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')]})
+    async for event in events:
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if catalog_writer is not None:
+                await catalog_writer
+            await async_omdb_client.close()
+            await async_data_manager.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+
+    """Routes the recommendation event stream to its native handler and everything else to Flask."""
+
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = RECOMMENDATION_EVENTS.match(scope['path'])
+        if match:
+            query = parse_qs(scope['query_string'].decode('latin-1'))
+            mood = query.get('mood', [None])[0]
+            return await serve_events(send, recommendation_events(int(match.group(1)), mood))
+    return await wsgi_application(scope, receive, send)
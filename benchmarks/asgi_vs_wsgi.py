@@ -0,0 +1,100 @@
+"""
+Compares the WSGI mode (Flask server, one thread per request) with the ASGI mode (uvicorn asgi:application)
+on the recommendation event stream, with OMDb and Gemini replaced by a local stub answering after a fixed latency.
+
+    python benchmarks/asgi_vs_wsgi.py --concurrency 100 --latency 1.0
+
+Prints a JSON summary per mode: wall time, throughput, latency percentiles of whole streams,
+failed streams and the peak number of server threads.
+"""
+
+import argparse
+import tempfile
+import asyncio
+import json
+import time
+import os
+
+import httpx
+
+from stubs import start_stub, stub_env
+from seed import seed_database
+from load import start_server, wait_until_ready, server_threads, percentile
+
+
+async def stream(client, base_url, user_id):
+
+    """Opens a recommendation stream and reads it until the 'done' event; returns its duration and event count."""
+
+    start = time.perf_counter()
+    recommendations = 0
+    async with client.stream('GET', f"{base_url}/users/{user_id}/recommendations/events",
+                             params={'mood': 'cheerful'}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == 'event: recommendation':
+                recommendations += 1
+            elif line == 'event: done':
+                break
+    return time.perf_counter() - start, recommendations
+
+
+async def run_mode(mode, env, concurrency):
+    process, base_url = start_server(mode, env)
+    peak_threads = 0
+    sampling = True
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, server_threads(process.pid) or 0)
+            await asyncio.sleep(0.05)
+
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await wait_until_ready(client, base_url, process)
+            for user_id in range(1, concurrency + 1):
+                await client.get(f"{base_url}/users/{user_id}/get_recommendations")
+            sampler = asyncio.create_task(sample_threads())
+            start = time.perf_counter()
+            results = await asyncio.gather(*[stream(client, base_url, user_id)
+                                             for user_id in range(1, concurrency + 1)], return_exceptions=True)
+            wall = time.perf_counter() - start
+            sampling = False
+            await sampler
+    finally:
+        process.terminate()
+        process.wait()
+    durations = [result[0] for result in results if not isinstance(result, BaseException)]
+    failed = [result for result in results if isinstance(result, BaseException) or not result[1]]
+    return {'mode': mode, 'streams': concurrency, 'failed': len(failed), 'wall_seconds': round(wall, 3),
+            'streams_per_second': round(len(durations) / wall, 2),
+            'p50': round(percentile(durations, 0.5), 3) if durations else None,
+            'p95': round(percentile(durations, 0.95), 3) if durations else None,
+            'p99': round(percentile(durations, 0.99), 3) if durations else None,
+            'peak_server_threads': peak_threads or None}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=100, help='recommendation streams opened at once')
+    parser.add_argument('--latency', type=float, default=1.0, help='seconds every stubbed upstream call takes')
+    parser.add_argument('--modes', default='wsgi,asgi', help='comma-separated modes to run')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(args.latency)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes.split(','):
+            env = dict(os.environ, DB_PATH=os.path.join(directory, f"{mode}.db"), SECRET_KEY='benchmark',
+                       POSTER_DEADLINE=str(max(5.0, args.latency * 5)), OMDB_WORKERS=str(args.concurrency),
+                       **stub_env(stub_url))
+            seed_database(env, args.concurrency, 3)
+            results.append(await run_mode(mode, env, args.concurrency))
+    stub.terminate()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,291 @@
+"""
+Load test of the main routes against a seeded database, with OMDb and Gemini replaced by local stubs.
+
+    python benchmarks/load.py --users 10000 --movies 500 --concurrency 32 --requests 2000 --output before.json
+    python benchmarks/load.py --db /tmp/benchmark.db --scenarios user_movies,update_movie --latency 0.2
+
+Every scenario runs its operations from --concurrency clients at once and reports throughput, latency percentiles
+of whole operations and SQL queries per HTTP request (read from the Server-Timing header) as JSON,
+so the results of two commits can be diffed. A database given with --db is copied before the run.
+"""
+
+from urllib.parse import urlsplit
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import sqlite3
+import random
+import shutil
+import json
+import time
+import sys
+import os
+import re
+
+import httpx
+
+from stubs import start_stub, stub_env, free_port
+from seed import seed_database, ROOT
+
+SCENARIOS = ('list_users', 'user_movies', 'add_movie', 'update_movie', 'delete_movie', 'get_recommendations')
+SERVER_COMMANDS = {
+    'wsgi': [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', '{port}', '--with-threads'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', '{port}', '--log-level', 'warning',
+             '--backlog', '4096']
+}
+SQL_CALLS = re.compile(r'\bsqlite;desc="(\d+) calls"')
+JOB_POLL_INTERVAL = 0.05
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else None
+
+
+def server_threads(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        return None
+
+
+def start_server(mode, env):
+
+    """Starts the application in WSGI (Flask server) or ASGI (uvicorn) mode and returns the process and base URL."""
+
+    port = free_port()
+    process = subprocess.Popen([part.format(port=port) for part in SERVER_COMMANDS[mode]], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_ready(client, base_url, process):
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError('The server exited during startup')
+        try:
+            await client.get(f"{base_url}/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError('The server did not start')
+
+
+def sample_entries(db_path, count, seed):
+
+    """Picks distinct random library entries with the data needed to post them back to the update form."""
+
+    connection = sqlite3.connect(db_path)
+    try:
+        last_id = connection.execute('SELECT max(id) FROM library_entry').fetchone()[0] or 0
+        ids = random.Random(seed).sample(range(1, last_id + 1), min(count, last_id))
+        rows = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows += connection.execute(
+                'SELECT library_entry.id, user_id, title, director, year, poster FROM library_entry '
+                'JOIN catalog_movie ON catalog_movie.id = library_entry.movie_id '
+                f"WHERE library_entry.id IN ({','.join('?' * len(batch))})", batch).fetchall()
+        user_count = connection.execute('SELECT count(*) FROM user_account').fetchone()[0]
+    finally:
+        connection.close()
+    random.Random(seed).shuffle(rows)
+    return rows, user_count
+
+
+class Operation:
+
+    """Outcome of one scenario operation: its HTTP responses and whether it did what it was meant to do."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = []
+        self.ok = True
+
+
+class LoadDriver:
+
+    """Runs the scenario operations against a server; every operation is one user action
+    and may send several HTTP requests. Redirects are not followed, so each request is measured on its own."""
+
+    def __init__(self, client, base_url, users, entries, seed):
+        self.client = client
+        self.base_url = base_url
+        self.users = users
+        self.rng = random.Random(seed)
+        half = len(entries) // 2
+        self.update_entries = entries[:half]
+        self.delete_entries = entries[half:]
+        self.counter = 0
+
+
+    async def send(self, operation, method, path, expected, **kwargs):
+        response = await self.client.request(method, f"{self.base_url}{path}", **kwargs)
+        self.client.cookies.clear()
+        match = SQL_CALLS.search(response.headers.get('Server-Timing', ''))
+        operation.requests += 1
+        operation.queries.append(int(match.group(1)) if match else 0)
+        if response.status_code != expected:
+            operation.ok = False
+        return response
+
+
+    def random_user(self):
+        return self.rng.randint(1, self.users)
+
+
+    async def list_users(self, operation):
+        await self.send(operation, 'GET', '/users', 200)
+
+
+    async def user_movies(self, operation):
+        await self.send(operation, 'GET', f"/users/{self.random_user()}/", 200)
+
+
+    async def add_movie(self, operation):
+        self.counter += 1
+        await self.send(operation, 'POST', f"/users/{self.random_user()}/add_movie", 302,
+                        data={'title': f"Load Movie {self.counter}"})
+
+
+    async def update_movie(self, operation):
+        entry_id, user_id, title, director, year, poster = self.update_entries.pop()
+        response = await self.send(operation, 'POST', f"/users/{user_id}/update_movie/{entry_id}", 200,
+                                   data={'title': title, 'director': director or '', 'year': year or '',
+                                         'rating': f"{self.rng.uniform(1, 10):.1f}", 'poster': poster or ''})
+        if b'successfully updated' not in response.content:
+            operation.ok = False
+
+
+    async def delete_movie(self, operation):
+        entry_id, user_id = self.delete_entries.pop()[:2]
+        await self.send(operation, 'POST', f"/users/{user_id}/delete_movie/{entry_id}", 302)
+
+
+    async def get_recommendations(self, operation):
+
+        """Opens the mood page, submits a mood and polls the recommendation job until it is finished."""
+
+        user_id = self.random_user()
+        await self.send(operation, 'GET', f"/users/{user_id}/get_recommendations", 200)
+        response = await self.send(operation, 'POST', f"/users/{user_id}/get_recommendations", 302,
+                                   data={'mood': 'cheerful', 'refresh': '1'})
+        if not operation.ok:
+            return
+        job_path = urlsplit(response.headers['Location']).path
+        while True:
+            status = (await self.send(operation, 'GET', f"{job_path}/status", 200)).json()
+            if status['status'] in ('done', 'failed'):
+                break
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+        if status['status'] != 'done' or not status['result']['recommendations']:
+            operation.ok = False
+
+
+    async def run(self, scenario, count, concurrency):
+
+        """Runs count operations of the scenario from concurrency clients and summarizes them."""
+
+        action = getattr(self, scenario)
+        remaining = count
+        durations = []
+        operations = []
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                operation = Operation()
+                start = time.perf_counter()
+                try:
+                    await action(operation)
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    print(f"{scenario} failed: {e!r}", file=sys.stderr)
+                    operation.ok = False
+                durations.append(time.perf_counter() - start)
+                operations.append(operation)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - start
+        queries = [value for operation in operations for value in operation.queries]
+        return {'operations': len(operations), 'http_requests': len(queries),
+                'errors': sum(not operation.ok for operation in operations), 'wall_seconds': round(wall, 3),
+                'operations_per_second': round(len(operations) / wall, 2) if wall else None,
+                'p50': round(percentile(durations, 0.5), 4) if durations else None,
+                'p95': round(percentile(durations, 0.95), 4) if durations else None,
+                'p99': round(percentile(durations, 0.99), 4) if durations else None,
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+                'max_queries_per_request': max(queries) if queries else None}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='seeded database to copy instead of seeding a new one')
+    parser.add_argument('--users', type=int, default=1000, help='users to seed')
+    parser.add_argument('--movies', type=int, default=50, help='movies in every seeded library')
+    parser.add_argument('--catalog', type=int, help='movies in the seeded catalog')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the data and of the request mix')
+    parser.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='wsgi')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run in order')
+    parser.add_argument('--concurrency', type=int, default=16, help='operations in flight at once')
+    parser.add_argument('--requests', type=int, default=500, help='operations per scenario')
+    parser.add_argument('--recommendations', type=int, default=50, help='operations of get_recommendations')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds every stubbed OMDb or Gemini call takes')
+    parser.add_argument('--output', help='file to write the JSON report to instead of stdout')
+    args = parser.parse_args()
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stub, stub_url = start_stub(args.latency)
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, DB_PATH=os.path.join(directory, 'benchmark.db'), SECRET_KEY='benchmark',
+                   SERVER_TIMING='true', POSTER_CACHE_DIR=os.path.join(directory, 'posters'),
+                   OMDB_WORKERS=str(max(8, args.concurrency)), **stub_env(stub_url))
+        if args.db:
+            shutil.copyfile(args.db, env['DB_PATH'])
+        else:
+            seed_database(env, args.users, args.movies, args.catalog, args.seed)
+        entries, users = sample_entries(env['DB_PATH'], args.requests * 2, args.seed)
+        process, base_url = start_server(args.server, env)
+        results = {}
+        try:
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+                await wait_until_ready(client, base_url, process)
+                driver = LoadDriver(client, base_url, users, entries, args.seed)
+                for scenario in scenarios:
+                    count = args.recommendations if scenario == 'get_recommendations' else args.requests
+                    if scenario in ('update_movie', 'delete_movie'):
+                        count = min(count, len(entries) // 2)
+                    results[scenario] = await driver.run(scenario, count, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait()
+            stub.terminate()
+    report = {'commit': git_commit(), 'server': args.server, 'database': args.db or {
+                  'users': args.users, 'movies': args.movies, 'catalog': args.catalog, 'seed': args.seed},
+              'concurrency': args.concurrency, 'latency': args.latency, 'scenarios': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Creates a benchmark database with a configurable number of users, each owning a library of catalog movies.
+
+    python benchmarks/seed.py /tmp/benchmark.db --users 10000 --movies 500 --catalog 20000
+
+The data is generated from --seed, so the same arguments always produce the same database. Library entry IDs
+are assigned per user: user N owns the entries (N - 1) * movies + 1 to N * movies.
+"""
+
+from datetime import datetime
+import subprocess
+import argparse
+import sqlite3
+import random
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage.search import normalize_title
+
+BATCH_SIZE = 50000
+
+
+def create_schema(env):
+
+    """Creates the tables and the search index in the database at env['DB_PATH'] with flask init-db."""
+
+    env = dict({'SECRET_KEY': 'benchmark', 'API_KEY': 'benchmark', 'GEMINI_API_KEY': 'benchmark'}, **env)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def catalog_rows(catalog, rng):
+    fetched_at = datetime.now().isoformat(sep=' ')
+    for movie_id in range(1, catalog + 1):
+        title = f"Seed Movie {movie_id}"
+        yield (movie_id, f"tt{movie_id:08d}", title, normalize_title(title), f"Director {movie_id % 997}",
+               1950 + movie_id % 75, round(rng.uniform(1, 10), 1), f"http://posters.invalid/{movie_id}.jpg",
+               fetched_at)
+
+
+def entry_rows(users, movies, catalog, rng):
+    entry_id = 0
+    for user_id in range(1, users + 1):
+        for movie_id in rng.sample(range(1, catalog + 1), movies):
+            entry_id += 1
+            personal_rating = round(rng.uniform(1, 10), 1) if rng.random() < 0.2 else None
+            yield entry_id, user_id, movie_id, personal_rating
+
+
+def insert_batches(connection, statement, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.executemany(statement, batch)
+            batch = []
+    if batch:
+        connection.executemany(statement, batch)
+
+
+def seed_database(env, users, movies, catalog=None, seed=0):
+
+    """
+    Creates the schema and fills it with users user1..userN owning `movies` distinct movies each,
+    drawn from a catalog of `catalog` movies (by default twice the library size, at least 1000).
+    """
+
+    catalog = catalog or max(1000, movies * 2)
+    if movies > catalog:
+        raise ValueError('A library cannot hold more movies than the catalog')
+    rng = random.Random(seed)
+    create_schema(env)
+    connection = sqlite3.connect(env['DB_PATH'])
+    try:
+        connection.execute('PRAGMA synchronous = OFF')
+        with connection:
+            insert_batches(connection, 'INSERT INTO catalog_movie (id, imdb_id, title, title_key, director, year, '
+                                       'rating, poster, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           catalog_rows(catalog, rng))
+            insert_batches(connection, 'INSERT INTO user_account (id, name) VALUES (?, ?)',
+                           ((user_id, f"user{user_id}") for user_id in range(1, users + 1)))
+            insert_batches(connection, 'INSERT INTO library_entry (id, user_id, movie_id, personal_rating) '
+                                       'VALUES (?, ?, ?, ?)',
+                           entry_rows(users, movies, catalog, rng))
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    return catalog
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='database file to create')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--movies', type=int, default=50, help='movies in every library')
+    parser.add_argument('--catalog', type=int, help='movies in the shared catalog')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    seed_database(dict(os.environ, DB_PATH=os.path.abspath(args.path)), args.users, args.movies, args.catalog,
+                  args.seed)
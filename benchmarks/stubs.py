@@ -0,0 +1,128 @@
+"""
+Local stand-ins for OMDb and the Gemini API with injectable latency, so benchmarks never call the real services.
+
+    python benchmarks/stubs.py --port 8900 --latency 0.2
+
+Point the application at the stub with OMDB_URL=http://127.0.0.1:8900/ and GEMINI_BASE_URL=http://127.0.0.1:8900/.
+"""
+
+from urllib.parse import urlsplit, parse_qs
+import multiprocessing
+import argparse
+import asyncio
+import socket
+import json
+
+
+class StubUpstream:
+
+    """Minimal HTTP server impersonating OMDb and the Gemini streaming API, answering after a fixed latency.
+    Every Gemini answer recommends new titles, so poster lookups always go to the OMDb stub."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.counter = 0
+
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers.get('content-length', 0)))
+            method, target, _ = request_line.split(' ', 2)
+            await asyncio.sleep(self.latency)
+            if ':streamGenerateContent' in target:
+                await self.gemini_stream(writer)
+            elif ':generateContent' in target:
+                await self.respond(writer, 'application/json', json.dumps(self.gemini_response()))
+            else:
+                title = parse_qs(urlsplit(target).query).get('t', ['Unknown'])[0]
+                await self.respond(writer, 'application/json', json.dumps(self.omdb_response(title)))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+    @staticmethod
+    async def respond(writer, content_type, body):
+        body = body.encode('utf-8')
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+
+    def recommendations_text(self):
+        self.counter += 1
+        return str([{'title': f"Stub Movie {self.counter}-{index}", 'comment': 'Recommended by the stub.'}
+                    for index in range(3)])
+
+
+    def gemini_response(self, text=None):
+        return {'candidates': [{'content': {'parts': [{'text': text if text is not None
+                                                       else self.recommendations_text()}], 'role': 'model'},
+                                'finishReason': 'STOP', 'index': 0}]}
+
+
+    async def gemini_stream(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        text = self.recommendations_text()
+        third = len(text) // 3
+        for chunk in (text[:third], text[third:2 * third], text[2 * third:]):
+            writer.write(f"data: {json.dumps(self.gemini_response(chunk))}\r\n\r\n".encode('utf-8'))
+            await writer.drain()
+            await asyncio.sleep(self.latency / 10)
+
+
+    @staticmethod
+    def omdb_response(title):
+        return {'Response': 'True', 'Title': title, 'Year': '2000', 'imdbRating': '7.0', 'Director': 'Stub Director',
+                'Poster': 'http://posters.invalid/poster.jpg', 'imdbID': f"tt{abs(hash(title)) % 10 ** 9}"}
+
+
+def run_stub(port, latency):
+
+    """Serves the stub upstream in its own process, so it does not compete with the load generator."""
+
+    async def serve():
+        server = await asyncio.start_server(StubUpstream(latency).handle, '127.0.0.1', port, backlog=4096)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(latency, port=None):
+
+    """Starts the stub upstream in a daemon process and returns the process and its base URL."""
+
+    port = port or free_port()
+    process = multiprocessing.Process(target=run_stub, args=(port, latency), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port}/"
+
+
+def stub_env(base_url):
+
+    """Environment variables pointing the application at the stub upstream."""
+
+    return {'API_KEY': 'benchmark', 'GEMINI_API_KEY': 'benchmark', 'OMDB_URL': base_url, 'GEMINI_BASE_URL': base_url}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds every stubbed call takes')
+    args = parser.parse_args()
+    run_stub(args.port, args.latency)
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+import threading
+import sqlite3
+import json
+import time
+
+
+class MemoryChatBackend:
+
+    """Keeps serialized chat histories in process memory, evicting the least recently used sessions
+    once max_sessions or max_bytes is exceeded."""
+
+    def __init__(self, max_sessions=1000, max_bytes=16 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, user_id):
+
+        """Returns the (history JSON, last use timestamp) pair of a session, or None."""
+
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._sessions.move_to_end(user_id)
+            return session
+
+
+    def set(self, user_id, history, updated_at):
+        with self._lock:
+            self._remove(user_id)
+            self._sessions[user_id] = (history, updated_at)
+            self.total_bytes += len(history)
+            while self._sessions and (len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._sessions)))
+
+
+    def delete(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+
+    def _remove(self, user_id):
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            self.total_bytes -= len(session[0])
+
+
+    def stats(self):
+        return {'sessions': len(self._sessions), 'bytes': self.total_bytes}
+
+
+class SQLiteChatBackend:
+
+    """Keeps serialized chat histories in a standalone SQLite file shared by all worker processes,
+    evicting the least recently used sessions above max_sessions."""
+
+    def __init__(self, db_path, max_sessions=10000):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS chat_session '
+                               '(user_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_chat_session_updated_at ON chat_session (updated_at)')
+
+
+    @contextmanager
+    def _connect(self):
+
+        """Opens a connection for one operation, commits it on success and always closes it."""
+
+        with closing(sqlite3.connect(self.db_path, timeout=5)) as connection, connection:
+            yield connection
+
+
+    def get(self, user_id):
+
+        """Returns the (history JSON, last use timestamp) pair of a session, or None."""
+
+        with self._connect() as connection:
+            return connection.execute('SELECT history, updated_at FROM chat_session WHERE user_id = ?',
+                                      (user_id,)).fetchone()
+
+
+    def set(self, user_id, history, updated_at):
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO chat_session (user_id, history, updated_at) VALUES (?, ?, ?)',
+                               (user_id, history, updated_at))
+            connection.execute('DELETE FROM chat_session WHERE user_id NOT IN '
+                               '(SELECT user_id FROM chat_session ORDER BY updated_at DESC LIMIT ?)',
+                               (self.max_sessions,))
+
+
+    def delete(self, user_id):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM chat_session WHERE user_id = ?', (user_id,))
+
+
+    def stats(self):
+        with self._connect() as connection:
+            sessions, total_bytes = connection.execute('SELECT count(*), coalesce(sum(length(history)), 0) '
+                                                       'FROM chat_session').fetchone()
+        return {'sessions': sessions, 'bytes': total_bytes}
+
+
+class ChatSessionStore:
+
+    """
+    Stores the history of every user's recommendation chat instead of live chat objects.
+    Sessions idle for longer than idle_ttl seconds expire, and only the last max_history messages are kept,
+    so memory stays bounded no matter how many users talk to the model.
+    """
+
+    def __init__(self, backend, open_chat, idle_ttl=1800, max_history=10):
+        self.backend = backend
+        self.open_chat = open_chat
+        self.idle_ttl = idle_ttl
+        self.max_history = max_history
+
+
+    def reset(self, user_id):
+
+        """Starts a new empty session for the user, dropping the previous history."""
+
+        self.backend.set(str(user_id), '[]', time.time())
+
+
+    def exists(self, user_id):
+
+        """Checks if the user has a session that has not expired."""
+
+        return self._load(user_id) is not None
+
+
+    def open(self, user_id, instructions):
+
+        """Creates a chat with the given instructions, restoring the user's stored history.
+        Returns None if the user has no session or it has expired."""
+
+        history = self._load(user_id)
+        if history is None:
+            return None
+        return self.open_chat(instructions, history)
+
+
+    def save(self, user_id, chat):
+
+        """Stores the chat history of the user, truncated to the last max_history messages."""
+
+        history = chat.get_history()[-self.max_history:] if self.max_history else []
+        while history and history[0].role != 'user':
+            history = history[1:]
+        serialized = json.dumps([content.model_dump(mode='json', exclude_none=True) for content in history])
+        self.backend.set(str(user_id), serialized, time.time())
+
+
+    def _load(self, user_id):
+        session = self.backend.get(str(user_id))
+        if session is None:
+            return None
+        history, updated_at = session
+        if time.time() - updated_at > self.idle_ttl:
+            self.backend.delete(str(user_id))
+            return None
+        return json.loads(history)
+
+
+    def stats(self):
+        return self.backend.stats()
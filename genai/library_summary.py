@@ -0,0 +1,87 @@
+from collections import Counter
+from itertools import zip_longest
+
+
+def estimate_tokens(text):
+
+    """Roughly estimates the number of tokens in a text (about four characters per token)."""
+
+    return max(1, len(text) // 4)
+
+
+def representatives(movies, key):
+
+    """Returns the best-rated movie of every group sharing the key, largest groups first."""
+
+    groups = {}
+    for movie in movies:
+        group = key(movie)
+        if group is not None:
+            groups.setdefault(group, []).append(movie)
+    ordered_groups = sorted(groups.values(), key=len, reverse=True)
+    return [max(group, key=lambda movie: movie.rating or 0) for group in ordered_groups]
+
+
+def prioritize_movies(movies):
+
+    """
+    Orders a library so that a prefix of any length is representative of it:
+    takes turns between the top-rated movies, the most recent ones
+    and one movie per director and per decade, then the rest in library order.
+    """
+
+    top_rated = sorted((movie for movie in movies if movie.rating is not None), key=lambda movie: -movie.rating)
+    most_recent = sorted((movie for movie in movies if movie.year), key=lambda movie: -movie.year)
+    by_director = representatives(movies, lambda movie: movie.director)
+    by_decade = representatives(movies, lambda movie: movie.year // 10 * 10 if movie.year else None)
+    ordered = []
+    seen = set()
+    for candidates in zip_longest(top_rated, most_recent, by_director, by_decade):
+        for movie in candidates:
+            if movie is not None and movie.title not in seen:
+                seen.add(movie.title)
+                ordered.append(movie)
+    ordered.extend(movie for movie in movies if movie.title not in seen)
+    return ordered
+
+
+def library_stats(movies, listed):
+
+    """Builds compact aggregate statistics of the whole library."""
+
+    ratings = [movie.rating for movie in movies if movie.rating is not None]
+    decades = Counter(f"{movie.year // 10 * 10}s" for movie in movies if movie.year)
+    directors = Counter(movie.director for movie in movies if movie.director)
+    return {
+        'total': len(movies),
+        'listed': listed,
+        'average_rating': round(sum(ratings) / len(ratings), 1) if ratings else None,
+        'decades': dict(decades.most_common(5)),
+        'top_directors': dict(directors.most_common(5))
+    }
+
+
+def summarize_library(movies, mood, token_budget):
+
+    """
+    Builds the recommendation prompt for a library under a token budget.
+    Small libraries are sent in full as [titles, mood]. Larger ones are sent as a representative subset of titles
+    followed by aggregate statistics of the whole library: [titles, mood, stats].
+    Returns the prompt, its estimated token count and the number of titles listed.
+    """
+
+    movies = list(movies)
+    contents = str([[movie.title for movie in movies], mood])
+    if estimate_tokens(contents) <= token_budget:
+        return contents, estimate_tokens(contents), len(movies)
+    base_tokens = estimate_tokens(str([[], mood, library_stats(movies, len(movies))]))
+    titles = []
+    used_chars = 0
+    for movie in prioritize_movies(movies):
+        title_chars = len(repr(movie.title)) + 2
+        if base_tokens + (used_chars + title_chars) // 4 > token_budget:
+            break
+        titles.append(movie.title)
+        used_chars += title_chars
+    contents = str([titles, mood, library_stats(movies, len(titles))])
+    return contents, estimate_tokens(contents), len(titles)
@@ -7,7 +7,8 @@ import ast
 load_dotenv()
 
 api_key = os.getenv('GEMINI_API_KEY')
-client = genai.Client(api_key=api_key)
+base_url = os.getenv('GEMINI_BASE_URL')
+client = genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=base_url) if base_url else None)
 
 
 def get_instructions(file_path):
@@ -24,15 +25,30 @@ def get_instructions(file_path):
         return None
 
 
-def open_chat(instructions):
+def chat_config(instructions):
 
-    """Creates and returns a new chat session using the provided system instructions."""
+    """Returns the generation settings shared by the synchronous and asyncio chats."""
 
-    return client.chats.create(model="gemini-2.0-flash", config=types.GenerateContentConfig(
+    return types.GenerateContentConfig(
             max_output_tokens=200,
             temperature=1.0,
             system_instruction=instructions
-        ))
+        )
+
+
+def open_chat(instructions, history=None):
+
+    """Creates and returns a new chat session using the provided system instructions,
+    optionally continuing from a previous history."""
+
+    return client.chats.create(model="gemini-2.0-flash", config=chat_config(instructions), history=history)
+
+
+def open_async_chat(instructions, history=None):
+
+    """Creates an asyncio chat session, the counterpart of open_chat for the ASGI mode."""
+
+    return client.aio.chats.create(model="gemini-2.0-flash", config=chat_config(instructions), history=history)
 
 
 def get_chat_ai_recommendations(chat, contents):
@@ -41,7 +57,13 @@ def get_chat_ai_recommendations(chat, contents):
     and returns the parsed result or None on error."""
 
     response = chat.send_message(contents)
-    result = response.text
+    return parse_recommendations(response.text)
+
+
+def parse_recommendations(result):
+
+    """Extracts the list of recommendations from the response text, returns None on error."""
+
     first_index = result.find('[')
     last_index = result.find(']')
     try:
@@ -53,3 +75,78 @@ def get_chat_ai_recommendations(chat, contents):
     except (IndexError, SyntaxError) as e:
         print(f"Error: {e}")
         return None
+
+
+class RecommendationStreamParser:
+
+    """Parses recommendation dictionaries out of streamed text chunks
+    as soon as their closing brace arrives."""
+
+    def __init__(self):
+        self.buffer = ''
+        self.depth = 0
+        self.start = None
+        self.quote = None
+        self.escaped = False
+
+
+    def feed(self, chunk):
+
+        """Adds a chunk of text and yields every recommendation completed by it."""
+
+        offset = len(self.buffer)
+        self.buffer += chunk
+        for index in range(offset, len(self.buffer)):
+            char = self.buffer[index]
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == self.quote:
+                    self.quote = None
+            elif char in ('"', "'") and self.depth:
+                self.quote = char
+            elif char == '{':
+                if not self.depth:
+                    self.start = index
+                self.depth += 1
+            elif char == '}' and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    try:
+                        result = ast.literal_eval(self.buffer[self.start:index + 1])
+                    except (SyntaxError, ValueError) as e:
+                        print(f"Error: {e}")
+                        continue
+                    if isinstance(result, dict):
+                        yield result
+
+
+def parse_recommendation_stream(chunks):
+
+    """Parses recommendation dictionaries out of streamed text chunks,
+    yielding each one as soon as its closing brace arrives."""
+
+    parser = RecommendationStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+
+def stream_chat_ai_recommendations(chat, contents):
+
+    """Sends a message to the chat session with a streamed response
+    and yields every recommendation as soon as it has been received."""
+
+    response = chat.send_message_stream(contents)
+    yield from parse_recommendation_stream(chunk.text or '' for chunk in response)
+
+
+async def stream_chat_ai_recommendations_async(chat, contents):
+
+    """Asyncio version of stream_chat_ai_recommendations for chats created by open_async_chat."""
+
+    parser = RecommendationStreamParser()
+    async for chunk in await chat.send_message_stream(contents):
+        for movie in parser.feed(chunk.text or ''):
+            yield movie
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import uuid
+import time
+
+
+class QueueFullError(Exception):
+
+    """Raised when a job is submitted while the queue already holds max_pending unfinished jobs."""
+
+
+class Job:
+
+    """State of a queued job: pending, running, done or failed."""
+
+    def __init__(self, owner=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = 'pending'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+
+    def as_dict(self):
+        return {'id': self.id, 'status': self.status, 'result': self.result, 'error': self.error}
+
+
+class JobQueue:
+
+    """
+    In-process job queue served by a pool of background worker threads.
+    Submitting returns a job ID immediately; the job state can be polled with get().
+    Finished jobs are kept for result_ttl seconds.
+    """
+
+    def __init__(self, workers=2, max_pending=100, result_ttl=600):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+
+    def submit(self, func, *args, owner=None, **kwargs):
+
+        """Queues func(*args, **kwargs) and returns the new job's ID.
+        Raises QueueFullError if too many jobs are waiting or running."""
+
+        job = Job(owner)
+        with self._lock:
+            self._purge()
+            pending = sum(1 for queued_job in self._jobs.values() if not queued_job.finished)
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs are already queued")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+
+    def get(self, job_id, owner=None):
+
+        """Returns the job with the given ID, or None if it does not exist, has expired or belongs to another owner."""
+
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+
+    def _run(self, job, func, args, kwargs):
+        job.status = 'running'
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = 'done'
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = time.time()
+
+
+    def _purge(self):
+        expired_before = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < expired_before]:
+            del self._jobs[job_id]
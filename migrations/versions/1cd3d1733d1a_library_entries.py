@@ -0,0 +1,122 @@
+"""Library entries.
+
+Revision ID: 1cd3d1733d1a
+Revises: ae33c2e1a320
+Create Date: 2026-10-17 09:12:40.583102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = '1cd3d1733d1a'
+down_revision = 'ae33c2e1a320'
+branch_labels = None
+depends_on = None
+
+
+def normalize_title(title):
+    return ' '.join(title.casefold().split())
+
+
+def create_search_index(table):
+    op.execute(f"CREATE VIRTUAL TABLE movie_fts USING fts5(title, director, content='{table}', content_rowid='id', "
+               f"tokenize='unicode61 remove_diacritics 2')")
+    op.execute(f"CREATE TRIGGER movie_fts_insert AFTER INSERT ON {table} BEGIN "
+               f"INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END")
+    op.execute(f"CREATE TRIGGER movie_fts_delete AFTER DELETE ON {table} BEGIN "
+               f"INSERT INTO movie_fts (movie_fts, rowid, title, director) "
+               f"VALUES ('delete', old.id, old.title, old.director); END")
+    op.execute(f"CREATE TRIGGER movie_fts_update AFTER UPDATE OF title, director ON {table} BEGIN "
+               f"INSERT INTO movie_fts (movie_fts, rowid, title, director) "
+               f"VALUES ('delete', old.id, old.title, old.director); "
+               f"INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END")
+    op.execute("INSERT INTO movie_fts (movie_fts) VALUES ('rebuild')")
+
+
+def drop_search_index():
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_update')
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_delete')
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_insert')
+    op.execute('DROP TABLE IF EXISTS movie_fts')
+
+
+def upgrade():
+    drop_search_index()
+    op.create_table('library_entry',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('movie_id', sa.Integer(), nullable=False),
+                    sa.Column('personal_rating', sa.Float(), nullable=True),
+                    sa.ForeignKeyConstraint(['movie_id'], ['catalog_movie.id'], ),
+                    sa.ForeignKeyConstraint(['user_id'], ['user_account.id'], ),
+                    sa.PrimaryKeyConstraint('id'))
+    with op.batch_alter_table('library_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_library_entry_movie_id', ['movie_id'], unique=False)
+        batch_op.create_index('ix_library_entry_user_id_movie_id', ['user_id', 'movie_id'], unique=True)
+
+    # every distinct version of a movie becomes one catalog movie, OMDb movies already in the catalog are reused;
+    # entries keep the IDs of the movies they replace, so existing links stay valid
+    connection = op.get_bind()
+    catalog_ids = {}
+    for row in connection.execute(sa.text('SELECT id, title, director, year, poster FROM catalog_movie '
+                                          'ORDER BY imdb_id IS NOT NULL, id DESC')):
+        catalog_ids[(row.title, row.director, row.year, row.poster)] = row.id
+    catalog_ratings = dict(connection.execute(sa.text('SELECT id, rating FROM catalog_movie')).all())
+    entries = []
+    for movie in connection.execute(sa.text('SELECT id, user_id, title, director, year, rating, poster FROM movie '
+                                            'ORDER BY id')).all():
+        key = (movie.title, movie.director, movie.year, movie.poster)
+        if key not in catalog_ids:
+            result = connection.execute(sa.text('INSERT INTO catalog_movie '
+                                                '(title, title_key, director, year, rating, poster, fetched_at) '
+                                                'VALUES (:title, :title_key, :director, :year, :rating, :poster, '
+                                                ':fetched_at)'),
+                                        {'title': movie.title, 'title_key': normalize_title(movie.title),
+                                         'director': movie.director, 'year': movie.year, 'rating': movie.rating,
+                                         'poster': movie.poster, 'fetched_at': datetime.now()})
+            catalog_ids[key] = result.lastrowid
+            catalog_ratings[result.lastrowid] = movie.rating
+        movie_id = catalog_ids[key]
+        personal_rating = None if movie.rating == catalog_ratings[movie_id] else movie.rating
+        entries.append({'id': movie.id, 'user_id': movie.user_id, 'movie_id': movie_id,
+                        'personal_rating': personal_rating})
+    if entries:
+        connection.execute(sa.text('INSERT INTO library_entry (id, user_id, movie_id, personal_rating) '
+                                   'VALUES (:id, :user_id, :movie_id, :personal_rating)'), entries)
+
+    with op.batch_alter_table('movie', schema=None) as batch_op:
+        batch_op.drop_index('ix_movie_user_id_title')
+    op.drop_table('movie')
+    create_search_index('catalog_movie')
+
+
+def downgrade():
+    drop_search_index()
+    op.create_table('movie',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('title', sa.String(), nullable=False),
+                    sa.Column('director', sa.String(), nullable=True),
+                    sa.Column('year', sa.Integer(), nullable=True),
+                    sa.Column('rating', sa.Float(), nullable=True),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('poster', sa.String(), nullable=True),
+                    sa.ForeignKeyConstraint(['user_id'], ['user_account.id'], ),
+                    sa.PrimaryKeyConstraint('id'))
+    # copies of the same title with different metadata cannot coexist in the old schema, the oldest one is kept
+    op.execute('INSERT INTO movie (id, title, director, year, rating, user_id, poster) '
+               'SELECT library_entry.id, title, director, year, coalesce(personal_rating, rating), user_id, poster '
+               'FROM library_entry JOIN catalog_movie ON catalog_movie.id = library_entry.movie_id '
+               'WHERE library_entry.id IN (SELECT min(library_entry.id) FROM library_entry '
+               'JOIN catalog_movie ON catalog_movie.id = library_entry.movie_id GROUP BY user_id, title)')
+    with op.batch_alter_table('movie', schema=None) as batch_op:
+        batch_op.create_index('ix_movie_user_id_title', ['user_id', 'title'], unique=True)
+
+    with op.batch_alter_table('library_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_library_entry_user_id_movie_id')
+        batch_op.drop_index('ix_library_entry_movie_id')
+    op.drop_table('library_entry')
+    op.execute('DELETE FROM catalog_movie WHERE imdb_id IS NULL')
+    create_search_index('movie')
@@ -0,0 +1,29 @@
+"""User name changed at.
+
+Revision ID: 49fd22920113
+Revises: c4f1e8a9d2b7
+Create Date: 2026-10-17 14:20:37.512904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '49fd22920113'
+down_revision = 'c4f1e8a9d2b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_account', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_changed_at', sa.DateTime(), nullable=True))
+    user_account = sa.table('user_account', sa.column('updated_at', sa.DateTime()),
+                            sa.column('name_changed_at', sa.DateTime()))
+    op.execute(user_account.update().values(name_changed_at=user_account.c.updated_at))
+
+
+def downgrade():
+    with op.batch_alter_table('user_account', schema=None) as batch_op:
+        batch_op.drop_column('name_changed_at')
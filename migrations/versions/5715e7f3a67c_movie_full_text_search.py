@@ -0,0 +1,37 @@
+"""Movie full-text search.
+
+Revision ID: 5715e7f3a67c
+Revises: 83a2455e7bb3
+Create Date: 2026-10-17 08:02:11.408153
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5715e7f3a67c'
+down_revision = '83a2455e7bb3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE VIRTUAL TABLE movie_fts USING fts5(title, director, content='movie', content_rowid='id', "
+               "tokenize='unicode61 remove_diacritics 2')")
+    op.execute("CREATE TRIGGER movie_fts_insert AFTER INSERT ON movie BEGIN "
+               "INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END")
+    op.execute("CREATE TRIGGER movie_fts_delete AFTER DELETE ON movie BEGIN "
+               "INSERT INTO movie_fts (movie_fts, rowid, title, director) "
+               "VALUES ('delete', old.id, old.title, old.director); END")
+    op.execute("CREATE TRIGGER movie_fts_update AFTER UPDATE OF title, director ON movie BEGIN "
+               "INSERT INTO movie_fts (movie_fts, rowid, title, director) "
+               "VALUES ('delete', old.id, old.title, old.director); "
+               "INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END")
+    op.execute("INSERT INTO movie_fts (movie_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_update')
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_delete')
+    op.execute('DROP TRIGGER IF EXISTS movie_fts_insert')
+    op.execute('DROP TABLE IF EXISTS movie_fts')
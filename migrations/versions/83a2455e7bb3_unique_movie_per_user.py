@@ -0,0 +1,27 @@
+"""Unique movie title per user.
+
+Revision ID: 83a2455e7bb3
+Revises: 89e57c441b80
+Create Date: 2026-10-17 07:07:24.121323
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '83a2455e7bb3'
+down_revision = '89e57c441b80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keep only the oldest copy of movies added twice before the constraint existed
+    op.execute('DELETE FROM movie WHERE id NOT IN (SELECT min(id) FROM movie GROUP BY user_id, title)')
+    with op.batch_alter_table('movie', schema=None) as batch_op:
+        batch_op.create_index('ix_movie_user_id_title', ['user_id', 'title'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('movie', schema=None) as batch_op:
+        batch_op.drop_index('ix_movie_user_id_title')
@@ -0,0 +1,40 @@
+"""Catalog movie mirror.
+
+Revision ID: ae33c2e1a320
+Revises: 5715e7f3a67c
+Create Date: 2026-10-17 08:31:46.219574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae33c2e1a320'
+down_revision = '5715e7f3a67c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_movie',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('imdb_id', sa.String(), nullable=True),
+                    sa.Column('title', sa.String(), nullable=False),
+                    sa.Column('title_key', sa.String(), nullable=False),
+                    sa.Column('director', sa.String(), nullable=True),
+                    sa.Column('year', sa.Integer(), nullable=True),
+                    sa.Column('rating', sa.Float(), nullable=True),
+                    sa.Column('poster', sa.String(), nullable=True),
+                    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'))
+    with op.batch_alter_table('catalog_movie', schema=None) as batch_op:
+        batch_op.create_index('ix_catalog_movie_imdb_id', ['imdb_id'], unique=True)
+        batch_op.create_index('ix_catalog_movie_title_key', ['title_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_movie', schema=None) as batch_op:
+        batch_op.drop_index('ix_catalog_movie_title_key')
+        batch_op.drop_index('ix_catalog_movie_imdb_id')
+    op.drop_table('catalog_movie')
@@ -0,0 +1,31 @@
+"""User library version.
+
+Revision ID: c4f1e8a9d2b7
+Revises: 1cd3d1733d1a
+Create Date: 2026-10-17 13:05:12.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1e8a9d2b7'
+down_revision = '1cd3d1733d1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_account', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('library_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    user_account = sa.table('user_account', sa.column('updated_at', sa.DateTime()))
+    op.execute(user_account.update().values(updated_at=datetime.now()))
+
+
+def downgrade():
+    with op.batch_alter_table('user_account', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('library_version')
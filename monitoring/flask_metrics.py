@@ -0,0 +1,82 @@
+from monitoring.metrics import request_duration, request_queries, dependency_calls, dependency_duration
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import time
+
+
+def record_timing(dependency, duration):
+
+    """Adds a dependency call to the timings of the current request; does nothing outside of a request."""
+
+    if not has_request_context():
+        return
+    timings = g.setdefault('dependency_timings', {})
+    count, total = timings.get(dependency, (0, 0.0))
+    timings[dependency] = (count + 1, total + duration)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    dependency = conn.dialect.name
+    dependency_calls.inc(dependency=dependency, outcome='ok')
+    dependency_duration.observe(duration, dependency=dependency)
+    record_timing(dependency, duration)
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+
+
+def handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is None or not conn.info.get('query_start'):
+        return
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    dependency_calls.inc(dependency=conn.dialect.name, outcome='error')
+    dependency_duration.observe(duration, dependency=conn.dialect.name)
+
+
+def instrument_sqlalchemy():
+
+    """Times every SQL statement executed by any engine and counts it for the current request."""
+
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+
+
+def instrument_app(app, server_timing=False):
+
+    """
+    Records the duration of every request by route and the number of SQL queries it executed.
+    With server_timing enabled, responses get a Server-Timing header with the total duration
+    and the time spent in each dependency.
+    """
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.dependency_timings = {}
+        g.sql_queries = 0
+
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        timings = g.get('dependency_timings', {})
+        request_duration.observe(duration, route=route, method=request.method, status=response.status_code)
+        request_queries.observe(g.get('sql_queries', 0), route=route)
+        if server_timing:
+            metrics = [f"app;dur={duration * 1000:.1f}"]
+            for dependency, (count, total) in timings.items():
+                metrics.append(f'{dependency};desc="{count} calls";dur={total * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(metrics)
+        return response
@@ -0,0 +1,178 @@
+from contextlib import contextmanager
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def format_labels(labels):
+
+    """Formats label pairs in the Prometheus text exposition format."""
+
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Counter:
+
+    """Monotonic counter with optional labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+
+class Histogram:
+
+    """Histogram of observed values with cumulative buckets and optional labels."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            bucket_counts, count, total = self._values.get(key, ([0] * len(self.buckets), 0, 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    bucket_counts[index] += 1
+            self._values[key] = (bucket_counts, count + 1, total + value)
+
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (bucket_counts, count, total) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    samples.append((f"{self.name}_bucket", labels + (('le', bound),), bucket_count))
+                samples.append((f"{self.name}_bucket", labels + (('le', '+Inf'),), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Gauge:
+
+    """Gauge whose samples are collected on demand by a callback returning a {labels dict: value} mapping."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, collect):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+
+
+    def samples(self):
+        return [(self.name, tuple(sorted(labels.items())), value) for labels, value in self.collect()]
+
+
+class MetricsRegistry:
+
+    """Holds the application metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics = []
+
+
+    def counter(self, name, documentation):
+        return self._register(Counter(name, documentation))
+
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, buckets))
+
+
+    def gauge(self, name, documentation, collect):
+        return self._register(Gauge(name, documentation, collect))
+
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+request_duration = registry.histogram('http_request_duration_seconds', 'Duration of HTTP requests by route.')
+dependency_calls = registry.counter('dependency_calls_total', 'Calls to external dependencies by outcome.')
+dependency_duration = registry.histogram('dependency_duration_seconds', 'Duration of calls to external dependencies.')
+request_queries = registry.histogram('sql_queries_per_request', 'Number of SQL queries executed per HTTP request.',
+                                     buckets=QUERY_BUCKETS)
+caches = {}
+
+
+def collect_cache_stats(field):
+    def collect():
+        return [({'cache': name}, stats()[field]) for name, stats in caches.items()]
+    return collect
+
+
+registry.gauge('cache_hits', 'Cache hits since start.', collect_cache_stats('hits'))
+registry.gauge('cache_misses', 'Cache misses since start.', collect_cache_stats('misses'))
+registry.gauge('cache_hit_ratio', 'Share of cache lookups served from the cache.', collect_cache_stats('hit_ratio'))
+
+
+def register_cache(name, stats):
+
+    """Exposes the hit/miss counters of a cache; stats is a callable returning a CacheStats.as_dict() style dict."""
+
+    caches[name] = stats
+
+
+@contextmanager
+def track_dependency(dependency, on_finish=None):
+
+    """
+    Times a call to an external dependency and counts it by outcome (ok or error).
+    on_finish, if given, is called with the dependency name and the duration in seconds.
+    """
+
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        dependency_calls.inc(dependency=dependency, outcome=outcome)
+        dependency_duration.observe(duration, dependency=dependency)
+        if on_finish:
+            on_finish(dependency, duration)
@@ -0,0 +1,83 @@
+from network.http_client import CircuitBreaker, CircuitOpenError, client_settings, RETRY_STATUSES
+import requests
+import asyncio
+import random
+import httpx
+
+
+class AsyncHTTPClient:
+
+    """
+    Asyncio counterpart of HTTPClient built on httpx.AsyncClient, with the same timeouts, retries,
+    jittered backoff and circuit breaker. pool_size connections are kept alive, but concurrent calls are not capped,
+    so slow upstreams are waited for without holding a thread or a pool slot per call.
+    Errors are raised as the requests exceptions HTTPClient raises, so callers handle both clients the same way.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, retries=2,
+                 backoff=0.3, max_backoff=5, breaker=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=None),
+                                        limits=httpx.Limits(max_connections=None,
+                                                            max_keepalive_connections=pool_size))
+
+
+    @classmethod
+    def from_env(cls, prefix):
+
+        """Creates a client configured by <prefix>_* environment variables, e.g. OMDB_READ_TIMEOUT."""
+
+        return cls(**client_settings(prefix))
+
+
+    async def _sleep_before_retry(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        await asyncio.sleep(random.uniform(0, delay))
+
+
+    async def get(self, url, params=None, **kwargs):
+
+        """
+        Sends a GET request and returns the response.
+        Raises CircuitOpenError without calling the upstream while the breaker is open,
+        or the last error once all retries are used up.
+        """
+
+        breaker = self.breaker.for_url(url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker is open for {url}")
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await self._sleep_before_retry(attempt - 1)
+                try:
+                    response = await self.client.get(url, params=params, **kwargs)
+                except httpx.TimeoutException as e:
+                    error = requests.exceptions.Timeout(str(e))
+                    continue
+                except httpx.TransportError as e:
+                    error = requests.exceptions.ConnectionError(str(e))
+                    continue
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    raise requests.exceptions.RequestException(str(e)) from e
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"Upstream responded with {response.status_code}",
+                                                      response=response)
+                # Releases the pooled connection, which a streamed response would otherwise keep
+                await response.aclose()
+        except BaseException:
+            # Errors that are not retried, including cancellation, still end a half-open trial.
+            breaker.record_failure()
+            raise
+        breaker.record_failure()
+        raise error
+
+
+    async def close(self):
+        await self.client.aclose()
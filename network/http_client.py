@@ -0,0 +1,198 @@
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from collections import OrderedDict
+import requests
+import threading
+import random
+import time
+import os
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+
+    """Raised when a call is refused because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+
+    """
+    Stops calling an upstream that keeps failing.
+    After failure_threshold consecutive failures the breaker opens and refuses calls for reset_timeout seconds,
+    then lets a single trial call through: success closes it again, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self._lock = threading.Lock()
+
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+
+    def allow_request(self):
+
+        """Returns True if a call may be made right now."""
+
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+    def for_url(self, url):
+
+        """Returns the breaker guarding calls to the URL, which is this one for every URL."""
+
+        return self
+
+
+class HostCircuitBreakers:
+
+    """
+    Keeps a separate CircuitBreaker for every host, so upstreams chosen by users, such as poster hosts,
+    only suspend calls to themselves. Breakers of the least recently used hosts above max_hosts are dropped.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, max_hosts=1024):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_hosts = max_hosts
+        self.breakers = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def for_url(self, url):
+
+        """Returns the breaker of the URL's host, creating it on first use."""
+
+        host = (urlsplit(url).hostname or '').lower()
+        with self._lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self.breakers.move_to_end(host)
+            while len(self.breakers) > self.max_hosts:
+                self.breakers.popitem(last=False)
+            return breaker
+
+
+def client_settings(prefix, per_host_breaker=False):
+
+    """Returns the HTTP client options configured by <prefix>_* environment variables.
+    With per_host_breaker, every host gets its own circuit breaker with these settings."""
+
+    def setting(name, default, cast=float):
+        return cast(os.getenv(f"{prefix}_{name}", default))
+
+    breaker_class = HostCircuitBreakers if per_host_breaker else CircuitBreaker
+    return {'pool_size': setting('POOL_SIZE', 10, int),
+            'connect_timeout': setting('CONNECT_TIMEOUT', 3.05),
+            'read_timeout': setting('READ_TIMEOUT', 10),
+            'retries': setting('RETRIES', 2, int),
+            'backoff': setting('BACKOFF', 0.3),
+            'max_backoff': setting('MAX_BACKOFF', 5),
+            'breaker': breaker_class(failure_threshold=setting('BREAKER_THRESHOLD', 5, int),
+                                     reset_timeout=setting('BREAKER_RESET', 30))}
+
+
+class HTTPClient:
+
+    """
+    Shared HTTP client built on a pooled keep-alive requests.Session.
+    Every call has connect/read timeouts; connection errors, timeouts and retryable statuses
+    are retried with jittered exponential backoff, and repeated failures open the circuit breaker.
+    Every call records its outcome in the breaker, including errors that are not retried.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=10, retries=2,
+                 backoff=0.3, max_backoff=5, breaker=None):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+
+    @classmethod
+    def from_env(cls, prefix, per_host_breaker=False):
+
+        """Creates a client configured by <prefix>_* environment variables, e.g. OMDB_READ_TIMEOUT."""
+
+        return cls(**client_settings(prefix, per_host_breaker))
+
+
+    def _sleep_before_retry(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        time.sleep(random.uniform(0, delay))
+
+
+    def get(self, url, params=None, **kwargs):
+
+        """
+        Sends a GET request and returns the response.
+        Raises CircuitOpenError without calling the upstream while the breaker is open,
+        or the last error once all retries are used up.
+        """
+
+        breaker = self.breaker.for_url(url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker is open for {url}")
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self._sleep_before_retry(attempt - 1)
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"Upstream responded with {response.status_code}",
+                                                      response=response)
+                # Releases the pooled connection, which a streamed response would otherwise keep
+                response.close()
+        except BaseException:
+            # Errors that are not retried (TooManyRedirects, InvalidURL, ...) still end a half-open trial.
+            breaker.record_failure()
+            raise
+        breaker.record_failure()
+        raise error
@@ -0,0 +1,162 @@
+from storage.data_manager_interface import DataManagerInterface
+from storage.sqlite_data_manager import SQLiteDataManager
+from storage.engine_config import get_engine_options
+from sqlalchemy import select
+from sqlalchemy.engine import ScalarResult
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+
+class SessionDatabase:
+
+    """Exposes a plain SQLAlchemy session through the db.session / db.select interface of Flask-SQLAlchemy,
+    which is all SQLDataManager uses of its db object."""
+
+    select = staticmethod(select)
+
+    def __init__(self, session):
+        self.session = session
+
+
+class AsyncDataManager(DataManagerInterface):
+
+    """
+    Asyncio implementation of the data manager on top of SQLAlchemy's asyncio extension
+    (aiosqlite for SQLite, psycopg for PostgreSQL).
+    Every method opens an AsyncSession and runs the matching method of manager_class on it through run_sync,
+    so queries, pagination and write notifications are shared with the synchronous manager,
+    while waiting for the database never blocks the event loop.
+    Results are fully loaded before the session closes and stay usable afterwards.
+    """
+
+    def __init__(self, database_url, db_path, user_model, entry_model, catalog_model, manager_class=SQLiteDataManager,
+                 engine_options=None, query_cache=None):
+        self.db_file_name = database_url
+        self.db_path = db_path
+        self.user_model = user_model
+        self.entry_model = entry_model
+        self.catalog_model = catalog_model
+        self.manager_class = manager_class
+        self.query_cache = query_cache
+        self.engine = create_async_engine(self.db_file_name, **(engine_options or get_engine_options()))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.write_listeners = []
+
+
+    async def _run(self, method, *args, **kwargs):
+        async with self.sessions() as session:
+            def call(sync_session):
+                manager = self.manager_class(self.db_file_name, self.db_path, self.user_model, self.entry_model,
+                                             SessionDatabase(sync_session), self.catalog_model, self.query_cache)
+                manager.write_listeners = self.write_listeners
+                result = getattr(manager, method)(*args, **kwargs)
+                return result.all() if isinstance(result, ScalarResult) else result
+            return await session.run_sync(call)
+
+
+    def add_write_listener(self, listener):
+
+        """Registers a callback called with the user ID after every committed change to that user's library."""
+
+        self.write_listeners.append(listener)
+
+
+    async def get_all_users(self):
+        return await self._run('get_all_users')
+
+
+    async def get_user_movies(self, user_id):
+        return await self._run('get_user_movies', user_id)
+
+
+    async def get_library_version(self, user_id):
+        return await self._run('get_library_version', user_id)
+
+
+    async def get_users_version(self):
+        return await self._run('get_users_version')
+
+
+    async def get_users_page(self, limit, cursor=None):
+        return await self._run('get_users_page', limit, cursor)
+
+
+    async def get_user_movies_page(self, user_id, limit, cursor=None, sort='title', descending=False,
+                                   director=None, year_from=None, year_to=None):
+        return await self._run('get_user_movies_page', user_id, limit, cursor, sort, descending,
+                               director, year_from, year_to)
+
+
+    async def get_movie_by_id(self, movie_id):
+        return await self._run('get_movie_by_id', movie_id)
+
+
+    async def add_user(self, name):
+        return await self._run('add_user', name)
+
+
+    async def delete_user(self, user_id):
+        return await self._run('delete_user', user_id)
+
+
+    async def update_user(self, user_id, new_name):
+        return await self._run('update_user', user_id, new_name)
+
+
+    async def add_movie(self, title, user_id, director, year, rating, poster):
+        return await self._run('add_movie', title, user_id, director, year, rating, poster)
+
+
+    async def add_movies(self, user_id, movies, skip_existing=False):
+        return await self._run('add_movies', user_id, movies, skip_existing)
+
+
+    async def delete_movie(self, movie_id):
+        return await self._run('delete_movie', movie_id)
+
+
+    async def update_movie(self, movie_id, title, director, year, rating, poster):
+        return await self._run('update_movie', movie_id, title, director, year, rating, poster)
+
+
+    async def delete_movies(self, user_id, movie_ids):
+        return await self._run('delete_movies', user_id, movie_ids)
+
+
+    async def update_movies(self, user_id, updates):
+        return await self._run('update_movies', user_id, updates)
+
+
+    async def user_in_database(self, user_name):
+        return await self._run('user_in_database', user_name)
+
+
+    async def movie_in_database(self, movie_title, user_id):
+        return await self._run('movie_in_database', movie_title, user_id)
+
+
+    async def get_user_movie_titles(self, user_id):
+        return await self._run('get_user_movie_titles', user_id)
+
+
+    async def search_movies(self, query, user_id=None, limit=50):
+        return await self._run('search_movies', query, user_id, limit)
+
+
+    async def rebuild_search_index(self):
+        return await self._run('rebuild_search_index')
+
+
+    async def get_catalog_movie(self, title_key):
+        return await self._run('get_catalog_movie', title_key)
+
+
+    async def save_catalog_movies(self, movies):
+        return await self._run('save_catalog_movies', movies)
+
+
+    async def check_database_connection(self):
+        return await self._run('check_database_connection')
+
+
+    async def close(self):
+        await self.engine.dispose()
@@ -0,0 +1,301 @@
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+import threading
+import sqlite3
+import json
+import time
+
+
+class CacheStats:
+
+    """Thread-safe hit/miss/eviction counters shared by the cache tiers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+
+    def record_eviction(self):
+        with self._lock:
+            self.evictions += 1
+
+
+    def as_dict(self):
+
+        """Returns the counters together with the hit ratio."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+class LRUCache:
+
+    """In-process least-recently-used cache with a per-entry time to live."""
+
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+
+        """Returns the cached value for the key, or None if it is missing or expired."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.record_miss()
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats.record_miss()
+                return None
+            self._entries.move_to_end(key)
+            self.stats.record_hit()
+            return value
+
+
+    def set(self, key, value, ttl=None):
+
+        """Stores the value under the key, evicting the least recently used entries above max_size."""
+
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.record_eviction()
+
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+    def delete_matching(self, predicate):
+
+        """Removes every entry whose key satisfies the predicate."""
+
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+
+    def delete_items_matching(self, predicate):
+
+        """Removes every entry for whose key and value the predicate is true."""
+
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class QueryCache:
+
+    """
+    Read-through cache of data manager results keyed by (kind, user ID, ...) tuples; shared lookups
+    such as the users list use None as the user ID. Values must be immutable snapshots, since they are
+    shared between threads. Invalidation bumps a generation counter, so a result loaded while a write
+    was being committed is not stored.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.entries = LRUCache(max_size=max_size, ttl=ttl)
+        self.stats = self.entries.stats
+        self._generation = 0
+        self._lock = threading.Lock()
+
+
+    def get_or_load(self, key, load):
+
+        """Returns the cached value for the key, or calls load and caches its result unless it is None."""
+
+        value = self.entries.get(key)
+        if value is None:
+            generation = self._generation
+            value = load()
+            with self._lock:
+                if value is not None and generation == self._generation:
+                    self.entries.set(key, value)
+        return value
+
+
+    def invalidate_user(self, user_id):
+
+        """Drops every cached result about the user's library, including single movies owned by the user."""
+
+        with self._lock:
+            self._generation += 1
+            self.entries.delete_items_matching(
+                lambda key, value: key[1] == user_id or getattr(value, 'user_id', None) == user_id)
+
+
+    def invalidate_users(self, kinds):
+
+        """
+        Drops the shared cached results of the given kinds about the set of users, such as the users list
+        and name lookups. Other shared results, such as single movies, are left to invalidate_user.
+        """
+
+        with self._lock:
+            self._generation += 1
+            self.entries.delete_matching(lambda key: key[1] is None and key[0] in kinds)
+
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.entries.clear()
+
+
+class SQLiteCache:
+
+    """On-disk cache tier storing JSON-serializable values in a standalone SQLite file,
+    so cached entries survive restarts and are shared between worker processes."""
+
+    def __init__(self, db_path, ttl=86400, max_size=50000):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = CacheStats()
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)')
+
+
+    @contextmanager
+    def _connect(self):
+
+        """Opens a connection for one operation, commits it on success and always closes it."""
+
+        with closing(sqlite3.connect(self.db_path, timeout=5)) as connection, connection:
+            yield connection
+
+
+    def get(self, key):
+
+        """Returns the cached value for the key, or None if it is missing or expired."""
+
+        return self.get_with_expiry(key)[0]
+
+
+    def get_with_expiry(self, key):
+
+        """Returns the cached value for the key and its expiry as a time.time() timestamp,
+        or (None, None) if it is missing or expired."""
+
+        with self._connect() as connection:
+            row = connection.execute('SELECT value, expires_at FROM cache WHERE key = ? AND expires_at >= ?',
+                                     (key, time.time())).fetchone()
+        if row is None:
+            self.stats.record_miss()
+            return None, None
+        self.stats.record_hit()
+        return json.loads(row[0]), row[1]
+
+
+    def set(self, key, value, ttl=None):
+
+        """Stores the value under the key and trims expired and overflowing entries."""
+
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                               (key, json.dumps(value), now + ttl))
+            connection.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+            overflow = connection.execute('DELETE FROM cache WHERE key IN '
+                                          '(SELECT key FROM cache ORDER BY expires_at LIMIT '
+                                          'max(0, (SELECT count(*) FROM cache) - ?))', (self.max_size,))
+            for _ in range(overflow.rowcount):
+                self.stats.record_eviction()
+
+
+    def delete(self, key):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM cache')
+
+
+class TieredCache:
+
+    """Combines a fast in-process tier with an optional persistent tier.
+    Values found only in the persistent tier are promoted to memory for no longer than they have left on disk."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value, expires_at = self.disk.get_with_expiry(key)
+            if value is not None:
+                self.memory.set(key, value, min(self.memory.ttl, expires_at - time.time()))
+        return value
+
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+    def stats(self):
+
+        """Returns the counters of every configured tier."""
+
+        stats = {'memory': self.memory.stats.as_dict()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats.as_dict()
+        return stats
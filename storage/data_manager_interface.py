@@ -2,6 +2,11 @@ from abc import ABC, abstractmethod
 
 class DataManagerInterface(ABC):
 
+    @abstractmethod
+    def add_write_listener(self, listener):
+        pass
+
+
     @abstractmethod
     def get_all_users(self):
         pass
@@ -12,6 +17,27 @@ class DataManagerInterface(ABC):
         pass
 
 
+    @abstractmethod
+    def get_library_version(self, user_id):
+        pass
+
+
+    @abstractmethod
+    def get_users_version(self):
+        pass
+
+
+    @abstractmethod
+    def get_users_page(self, limit, cursor=None):
+        pass
+
+
+    @abstractmethod
+    def get_user_movies_page(self, user_id, limit, cursor=None, sort='title', descending=False,
+                             director=None, year_from=None, year_to=None):
+        pass
+
+
     @abstractmethod
     def get_movie_by_id(self, movie_id):
         pass
@@ -37,6 +63,11 @@ class DataManagerInterface(ABC):
         pass
 
 
+    @abstractmethod
+    def add_movies(self, user_id, movies, skip_existing=False):
+        pass
+
+
     @abstractmethod
     def delete_movie(self, movie_id):
         pass
@@ -47,6 +78,16 @@ class DataManagerInterface(ABC):
         pass
 
 
+    @abstractmethod
+    def delete_movies(self, user_id, movie_ids):
+        pass
+
+
+    @abstractmethod
+    def update_movies(self, user_id, updates):
+        pass
+
+
     @abstractmethod
     def user_in_database(self, user_name):
         pass
@@ -57,6 +98,31 @@ class DataManagerInterface(ABC):
         pass
 
 
+    @abstractmethod
+    def get_user_movie_titles(self, user_id):
+        pass
+
+
+    @abstractmethod
+    def search_movies(self, query, user_id=None, limit=50):
+        pass
+
+
+    @abstractmethod
+    def rebuild_search_index(self):
+        pass
+
+
+    @abstractmethod
+    def get_catalog_movie(self, title_key):
+        pass
+
+
+    @abstractmethod
+    def save_catalog_movies(self, movies):
+        pass
+
+
     @abstractmethod
     def check_database_connection(self):
         pass
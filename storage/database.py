@@ -1,7 +1,33 @@
 from storage.sqlite_data_manager import SQLiteDataManager
-from storage.db_models import UserAccount, Movie, db
+from storage.postgres_data_manager import PostgreSQLDataManager
+from storage.db_models import UserAccount, LibraryEntry, CatalogMovie, db
+from storage.cache import QueryCache
+from sqlalchemy.engine import make_url
+from dotenv import load_dotenv
+import os
 
-db_path = '/Users/daniilkharaman/python/movieweb_app/database/data.db'
-DATABASE_URL = f"sqlite:///{db_path}"
+load_dotenv()
 
-data_manager = SQLiteDataManager(DATABASE_URL, db_path, user_model=UserAccount, movie_model=Movie, db=db)
+db_path = os.getenv('DB_PATH', '/Users/daniilkharaman/python/movieweb_app/database/data.db')
+DATABASE_URL = os.getenv('DATABASE_URL') or f"sqlite:///{db_path}"
+DATA_MANAGERS = {'sqlite': SQLiteDataManager, 'postgresql': PostgreSQLDataManager}
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'psycopg'}
+
+database_url = make_url(DATABASE_URL)
+backend = database_url.get_backend_name()
+if backend not in DATA_MANAGERS:
+    raise ValueError(f"Unsupported database backend: {backend}")
+if backend == 'sqlite':
+    db_path = database_url.database
+elif database_url.drivername == 'postgresql':
+    database_url = database_url.set(drivername='postgresql+psycopg')
+    db_path = None
+DATABASE_URL = database_url.render_as_string(hide_password=False)
+ASYNC_DATABASE_URL = database_url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")\
+    .render_as_string(hide_password=False)
+
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 1024))
+query_cache = QueryCache(max_size=QUERY_CACHE_SIZE, ttl=int(os.getenv('QUERY_CACHE_TTL', 60))) if QUERY_CACHE_SIZE else None
+
+data_manager = DATA_MANAGERS[backend](DATABASE_URL, db_path, user_model=UserAccount, entry_model=LibraryEntry, db=db,
+                                      catalog_model=CatalogMovie, query_cache=query_cache)
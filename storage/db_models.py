@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import List, Optional
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
+from datetime import datetime
 db = SQLAlchemy()
 model = db.Model
 
@@ -9,22 +10,67 @@ model = db.Model
 class UserAccount(model):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(unique=True)
-    movies: Mapped[List['Movie']] = relationship(back_populates='user', cascade='all, delete-orphan')
+    library_version: Mapped[int] = mapped_column(default=0, server_default='0')
+    updated_at: Mapped[Optional[datetime]] = mapped_column(default=datetime.now)
+    name_changed_at: Mapped[Optional[datetime]] = mapped_column(default=datetime.now)
+    entries: Mapped[List['LibraryEntry']] = relationship(back_populates='user', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f"UserAccount(id={self.id}, name={self.name})"
 
 
-class Movie(model):
+class CatalogMovie(model):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    imdb_id: Mapped[Optional[str]] = mapped_column(unique=True, index=True)
     title: Mapped[str]
+    title_key: Mapped[str] = mapped_column(index=True)
     director: Mapped[Optional[str]]
     year: Mapped[Optional[int]]
     rating: Mapped[Optional[float]]
     poster: Mapped[Optional[str]]
+    fetched_at: Mapped[datetime]
+    entries: Mapped[List['LibraryEntry']] = relationship(back_populates='movie')
+
+    def __repr__(self):
+        return f"CatalogMovie(id={self.id}, imdb_id={self.imdb_id}, title={self.title}, year={self.year})"
+
+
+class LibraryEntry(model):
+
+    """
+    A catalog movie in a user's library. The metadata is shared through the catalog,
+    only the personal rating is stored per user; the read-only properties expose the same fields
+    the templates used before the schema was normalized.
+    """
+
+    __table_args__ = (Index('ix_library_entry_user_id_movie_id', 'user_id', 'movie_id', unique=True),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user_account.id'))
-    user : Mapped['UserAccount'] = relationship(back_populates='movies')
+    movie_id: Mapped[int] = mapped_column(ForeignKey('catalog_movie.id'), index=True)
+    personal_rating: Mapped[Optional[float]]
+    user: Mapped['UserAccount'] = relationship(back_populates='entries')
+    movie: Mapped['CatalogMovie'] = relationship(back_populates='entries', lazy='joined', innerjoin=True)
+
+    @property
+    def title(self):
+        return self.movie.title
+
+    @property
+    def director(self):
+        return self.movie.director
+
+    @property
+    def year(self):
+        return self.movie.year
+
+    @property
+    def rating(self):
+        return self.movie.rating if self.personal_rating is None else self.personal_rating
+
+    @property
+    def poster(self):
+        return self.movie.poster
 
     def __repr__(self):
-        return (f"Movie(id={self.id}, title={self.title}, director={self.director},"
-                f"year={self.year}, rating={self.rating})")
+        return f"LibraryEntry(id={self.id}, user_id={self.user_id}, movie_id={self.movie_id}, title={self.title})"
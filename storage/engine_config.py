@@ -0,0 +1,70 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
+import os
+
+SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+
+
+def get_sqlite_pragmas():
+
+    """Returns the pragmas applied to every new SQLite connection, configured by SQLITE_* environment variables."""
+
+    return {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000))
+    }
+
+
+def get_engine_options():
+
+    """Returns the SQLAlchemy engine options (pool sizing) configured by DB_* environment variables."""
+
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
+
+def is_sqlite_connection(dbapi_connection):
+
+    """Checks if a DBAPI connection is a sqlite3 connection or SQLAlchemy's adapter around an aiosqlite one."""
+
+    driver_connection = getattr(dbapi_connection, 'driver_connection', None)
+    return (isinstance(dbapi_connection, sqlite3.Connection)
+            or type(driver_connection).__module__.split('.')[0] == 'aiosqlite')
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+
+    """Applies the configured pragmas to a freshly opened SQLite connection; other drivers are left untouched."""
+
+    if not is_sqlite_connection(dbapi_connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in get_sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def register_sqlite_pragmas():
+
+    """Makes every engine apply the SQLite pragmas when it opens a connection."""
+
+    if not event.contains(Engine, 'connect', apply_sqlite_pragmas):
+        event.listen(Engine, 'connect', apply_sqlite_pragmas)
+
+
+def expected_pragma_value(name, value):
+
+    """Normalizes a configured pragma value to the form SQLite reports it in."""
+
+    if name == 'synchronous':
+        return str(SYNCHRONOUS_LEVELS.get(str(value).upper(), value))
+    return str(value).lower()
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+EXPORT_FIELDS = ('user', 'title', 'director', 'year', 'rating', 'poster')
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+EXPORT_CHUNK_ROWS = 500
+
+
+def export_format(filename):
+
+    """Returns the export format matching the file extension, or None if it is neither CSV nor JSON Lines."""
+
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def export_chunks(rows, file_format, chunk_rows=EXPORT_CHUNK_ROWS):
+
+    """
+    Serializes (user name, movie) pairs as CSV with a header row or as JSON Lines,
+    yielding the text in chunks of chunk_rows rows, so the export is never held in memory as a whole.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+    for count, (user, movie) in enumerate(rows, 1):
+        values = (user, movie.title, movie.director, movie.year, movie.rating, movie.poster)
+        if file_format == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + '\n')
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def read_export(text_file, file_format):
+
+    """
+    Parses a CSV or JSON Lines export line by line, yielding the line number and the row of every movie.
+    JSON lines that cannot be parsed are yielded as None, so they are reported like other invalid rows;
+    undecodable text and malformed CSV raise ValueError or csv.Error.
+    """
+
+    if file_format == 'csv':
+        reader = csv.DictReader(text_file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text_file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row
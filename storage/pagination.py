@@ -0,0 +1,26 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values):
+
+    """Encodes the keyset position of the last row of a page into an opaque URL-safe cursor."""
+
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+
+    """Decodes a cursor created by encode_cursor.
+    Raises ValueError if the cursor is malformed."""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed cursor: {e}")
+    if not isinstance(values, list):
+        raise ValueError('Malformed cursor: a list is expected')
+    return values
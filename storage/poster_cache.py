@@ -0,0 +1,246 @@
+from requests.adapters import HTTPAdapter
+from requests.exceptions import InvalidURL
+from urllib.parse import urlsplit, urljoin
+from PIL import Image
+import ipaddress
+import threading
+import hashlib
+import socket
+import io
+import os
+
+POSTER_SIZES = {'thumb': 200, 'medium': 400, 'full': None}
+POSTER_SCHEMES = ('http', 'https')
+MAX_POSTER_PIXELS = 25_000_000
+MAX_POSTER_REDIRECTS = 3
+DOWNLOAD_CHUNK = 64 * 1024
+
+Image.MAX_IMAGE_PIXELS = MAX_POSTER_PIXELS
+
+
+class PosterError(ValueError):
+
+    """Raised when a poster URL or image is refused: a non-HTTP or non-public address, or an oversized image."""
+
+
+def check_poster_url(url, allow_private=False):
+
+    """
+    Checks that a poster URL is an http(s) URL whose host resolves only to public addresses,
+    so user-supplied posters cannot make the server call internal services. Raises PosterError otherwise.
+    Returns the first checked address to connect to, or None if private hosts are allowed.
+    """
+
+    parts = urlsplit(url or '')
+    if parts.scheme not in POSTER_SCHEMES or not parts.hostname:
+        raise PosterError(f"Only http(s) poster URLs are allowed: {url}")
+    if allow_private:
+        return None
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise PosterError(f"Impossible to resolve the poster host {parts.hostname}: {e}") from e
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0].split('%')[0]).is_global:
+            raise PosterError(f"The poster host {parts.hostname} is not a public address")
+    return addresses[0][4][0]
+
+
+class PinnedAddressAdapter(HTTPAdapter):
+
+    """
+    Transport adapter that checks every request with check_poster_url and connects to the checked address
+    instead of letting the connection resolve the host again, sending the original Host header and TLS server name.
+    A host that rebinds its DNS name to an internal address after the check is therefore never connected to.
+    """
+
+    def __init__(self, allow_private=False, **kwargs):
+        self.allow_private = allow_private
+        super().__init__(**kwargs)
+
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        address = check_poster_url(request.url, self.allow_private)
+        if address is not None:
+            if host_params['scheme'] == 'https':
+                pool_kwargs['server_hostname'] = host_params['host']
+                pool_kwargs['assert_hostname'] = host_params['host']
+            host_params['host'] = address
+        return host_params, pool_kwargs
+
+
+    def send(self, request, *args, **kwargs):
+        request.headers.setdefault('Host', urlsplit(request.url).netloc)
+        try:
+            return super().send(request, *args, **kwargs)
+        except InvalidURL as e:
+            # requests wraps the PosterError raised while building the connection pool key
+            if e.args and isinstance(e.args[0], PosterError):
+                raise e.args[0] from None
+            raise
+
+
+class PosterCache:
+
+    """
+    Content-addressed on-disk cache of poster images.
+    Every poster is downloaded once, stored under the SHA-256 of its content together with resized copies
+    for every entry of POSTER_SIZES, and the least recently used files are evicted above max_bytes.
+    Only public http(s) URLs are fetched (see check_poster_url), redirects included, through a PinnedAddressAdapter
+    mounted on the client's session, so the checked address is the one connected to. Downloads are cut off
+    at max_download_bytes and images over MAX_POSTER_PIXELS are refused before they are decoded.
+    """
+
+    def __init__(self, directory, http_client, max_bytes=256 * 1024 * 1024, max_download_bytes=10 * 1024 * 1024,
+                 allow_private=False):
+        self.directory = directory
+        self.http_client = http_client
+        self.max_bytes = max_bytes
+        self.max_download_bytes = max_download_bytes
+        self.allow_private = allow_private
+        self._lock = threading.Lock()
+        if not allow_private:
+            adapter = PinnedAddressAdapter(pool_connections=http_client.pool_size, pool_maxsize=http_client.pool_size,
+                                           max_retries=0)
+            http_client.session.mount('http://', adapter)
+            http_client.session.mount('https://', adapter)
+        os.makedirs(os.path.join(self.directory, 'urls'), exist_ok=True)
+
+
+    def _image_path(self, digest, size):
+        return os.path.join(self.directory, digest[:2], f"{digest}-{size}.jpg")
+
+
+    def _url_path(self, url):
+        return os.path.join(self.directory, 'urls', hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+
+    @staticmethod
+    def _write(path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as file:
+            file.write(content)
+        os.replace(temporary_path, path)
+
+
+    def get(self, url, size='thumb'):
+
+        """
+        Returns the path and content digest of the poster at the given URL in the requested size,
+        downloading and resizing it first if it is not cached yet.
+        """
+
+        digest = self._cached_digest(url)
+        if digest is None or not os.path.exists(self._image_path(digest, size)):
+            digest = self.fetch(url)
+        path = self._image_path(digest, size)
+        os.utime(path)
+        os.utime(self._url_path(url))
+        return path, digest
+
+
+    def _cached_digest(self, url):
+        try:
+            with open(self._url_path(url)) as file:
+                return file.read().strip()
+        except FileNotFoundError:
+            return None
+
+
+    def download(self, url):
+
+        """
+        Streams the poster at a checked URL into memory, following up to MAX_POSTER_REDIRECTS redirects
+        that are checked the same way. Raises PosterError if the body exceeds max_download_bytes.
+        """
+
+        for _ in range(MAX_POSTER_REDIRECTS + 1):
+            check_poster_url(url, self.allow_private)
+            response = self.http_client.get(url, stream=True, allow_redirects=False)
+            try:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers['Location'])
+                    continue
+                response.raise_for_status()
+                length = response.headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > self.max_download_bytes:
+                    raise PosterError(f"The poster is larger than {self.max_download_bytes} bytes: {url}")
+                chunks, size = [], 0
+                for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                    size += len(chunk)
+                    if size > self.max_download_bytes:
+                        raise PosterError(f"The poster is larger than {self.max_download_bytes} bytes: {url}")
+                    chunks.append(chunk)
+                return b''.join(chunks)
+            finally:
+                response.close()
+        raise PosterError(f"Too many redirects for the poster {url}")
+
+
+    def fetch(self, url):
+
+        """Downloads a poster, stores it in every size and returns its content digest."""
+
+        content = self.download(url)
+        digest = hashlib.sha256(content).hexdigest()
+        try:
+            image = Image.open(io.BytesIO(content))
+        except Image.DecompressionBombError as e:
+            raise PosterError(f"The poster image is too large: {e}") from e
+        if image.width * image.height > MAX_POSTER_PIXELS:
+            raise PosterError(f"The poster image is too large: {image.width}x{image.height}")
+        for size, width in POSTER_SIZES.items():
+            if width is None and image.format == 'JPEG':
+                self._write(self._image_path(digest, size), content)
+                continue
+            resized = image.convert('RGB')
+            if width is not None:
+                resized.thumbnail((width, width * 2))
+            output = io.BytesIO()
+            resized.save(output, format='JPEG', quality=85, optimize=True)
+            self._write(self._image_path(digest, size), output.getvalue())
+        self._write(self._url_path(url), digest.encode('ascii'))
+        self.evict()
+        return digest
+
+
+    def prefetch(self, url):
+
+        """Caches a poster ahead of its first request; errors are only logged."""
+
+        try:
+            if self._cached_digest(url) is None:
+                self.fetch(url)
+        except Exception as e:
+            print(f"Impossible to prefetch the poster {url}: {e}")
+
+
+    def evict(self):
+
+        """
+        Removes the least recently used images and URL mappings until the cache fits into max_bytes.
+        Both are touched on every hit, so a mapping is evicted along with the images it points to.
+        """
+
+        with self._lock:
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
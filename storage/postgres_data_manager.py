@@ -0,0 +1,96 @@
+from storage.sql_data_manager import SQLDataManager
+from storage.snapshots import MovieSnapshot
+from sqlalchemy import text, exc, case, and_, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+import re
+
+TRIGRAM_EXTENSION_STATEMENT = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+TRIGRAM_INDEX_STATEMENTS = (
+    "CREATE INDEX IF NOT EXISTS ix_catalog_movie_title_trgm ON catalog_movie USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_catalog_movie_director_trgm ON catalog_movie USING gin (director gin_trgm_ops)"
+)
+
+
+class PostgreSQLDataManager(SQLDataManager):
+
+    """
+    PostgreSQL implementation of the data manager for deployments with several writers or application nodes.
+    Queries are shared with SQLiteDataManager through SQLDataManager; PostgreSQL-specific are the connection
+    check, upserts with INSERT ... ON CONFLICT, library entries added with ON CONFLICT DO NOTHING RETURNING
+    instead of catching a failed insert, and search, which matches words with ILIKE backed by trigram indexes
+    instead of FTS5.
+    Catalog movies are inserted through the ORM, which uses INSERT ... RETURNING for their IDs on PostgreSQL.
+    """
+
+    insert_function = staticmethod(postgresql_insert)
+
+
+    def check_database_connection(self):
+
+        """Verifies that a connection to the database server can be established."""
+
+        try:
+            version = self.db.session.execute(text('SHOW server_version')).scalar()
+            print(f"Connection established (PostgreSQL {version})")
+            return True
+        except (exc.OperationalError, Exception) as e:
+            print(f"Impossible to connect with the database: {e}")
+            return False
+
+
+    def add_movie(self, title, user_id, director, year, rating, poster):
+
+        """Adds a movie to a user's library, reusing the catalog movie with the same metadata if there is one.
+        Raises IntegrityError if the movie is already in the user's library."""
+
+        try:
+            movie = self.find_or_add_catalog_movie(title, director, year, rating, poster)
+            statement = postgresql_insert(self.entry_model)\
+                .values(user_id=user_id, movie_id=movie.id, personal_rating=self.personal_rating(movie, rating))\
+                .on_conflict_do_nothing(index_elements=['user_id', 'movie_id']).returning(self.entry_model.id)
+            if self.db.session.execute(statement).scalar() is None:
+                raise exc.IntegrityError(str(statement), {'user_id': user_id, 'movie_id': movie.id},
+                                         ValueError('The movie is already in the library'))
+            self.bump_library_version([user_id])
+            self.db.session.commit()
+        except exc.IntegrityError:
+            self.db.session.rollback()
+            raise
+        self.notify_write(user_id)
+
+
+    def search_movies(self, query, user_id=None, limit=50):
+
+        """
+        Searches catalog titles and directors with ILIKE, either in one user's library or across all users.
+        Every word must appear in the title or the director; movies matching all words in the title come first.
+        """
+
+        words = re.findall(r'\w+', query or '')
+        if not words:
+            return []
+        catalog = self.catalog_model
+        title_match = and_(*[catalog.title.icontains(word, autoescape=True) for word in words])
+        statement = self.select_movies()\
+            .where(*[or_(catalog.title.icontains(word, autoescape=True),
+                         catalog.director.icontains(word, autoescape=True)) for word in words])\
+            .order_by(case((title_match, 0), else_=1), catalog.title, self.entry_model.id).limit(limit)
+        if user_id is not None:
+            statement = statement.where(self.entry_model.user_id == user_id)
+        return [MovieSnapshot(*row) for row in self.db.session.execute(statement)]
+
+
+    def rebuild_search_index(self):
+
+        """Creates the pg_trgm extension and the trigram indexes used by ILIKE searches if they are missing.
+        Without the extension searches still work, but scan the catalog."""
+
+        try:
+            self.db.session.execute(text(TRIGRAM_EXTENSION_STATEMENT))
+        except exc.DBAPIError as e:
+            self.db.session.rollback()
+            print(f"Trigram indexes were not created: {e.orig}")
+            return
+        for statement in TRIGRAM_INDEX_STATEMENTS:
+            self.db.session.execute(text(statement))
+        self.db.session.commit()
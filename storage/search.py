@@ -0,0 +1,38 @@
+import re
+
+SEARCH_INDEX_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movie_fts USING fts5(title, director, content='catalog_movie', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_insert AFTER INSERT ON catalog_movie BEGIN "
+    "INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_delete AFTER DELETE ON catalog_movie BEGIN "
+    "INSERT INTO movie_fts (movie_fts, rowid, title, director) VALUES ('delete', old.id, old.title, old.director); END",
+    "CREATE TRIGGER IF NOT EXISTS movie_fts_update AFTER UPDATE OF title, director ON catalog_movie BEGIN "
+    "INSERT INTO movie_fts (movie_fts, rowid, title, director) VALUES ('delete', old.id, old.title, old.director); "
+    "INSERT INTO movie_fts (rowid, title, director) VALUES (new.id, new.title, new.director); END",
+    "INSERT INTO movie_fts (movie_fts) VALUES ('rebuild')"
+)
+
+# bm25 weights of the indexed columns: title matches rank above director matches
+SEARCH_RANK = 'bm25(movie_fts, 10.0, 1.0)'
+
+
+def build_match_query(query):
+
+    """
+    Turns free text into an FTS5 MATCH expression where every word is a prefix term
+    and all words must match, e.g. 'dark kni' -> '"dark"* "kni"*'.
+    Returns None if the text contains no searchable words.
+    """
+
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def normalize_title(title):
+
+    """Normalizes a movie title for lookups and cache keys: case-folded with collapsed whitespace."""
+
+    return ' '.join(title.casefold().split())
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+
+    """Immutable row of a user account, safe to cache and share between threads."""
+
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class MovieSnapshot:
+
+    """Immutable row of a library entry with its catalog movie, exposing the same attributes as LibraryEntry;
+    the fields follow the columns of SQLDataManager.select_movies()."""
+
+    id: int
+    user_id: int
+    movie_id: int
+    title: str
+    director: Optional[str]
+    year: Optional[int]
+    rating: Optional[float]
+    poster: Optional[str]
+    personal_rating: Optional[float]
@@ -0,0 +1,562 @@
+from storage.data_manager_interface import DataManagerInterface
+from storage.pagination import encode_cursor, decode_cursor
+from storage.search import normalize_title
+from storage.snapshots import UserSnapshot, MovieSnapshot
+from sqlalchemy import exc, insert, update, delete, func, or_, and_
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+
+PROJECTION_BATCH = 1000
+
+
+class SQLDataManager(DataManagerInterface):
+
+    """
+    Data manager queries shared by the SQLite and PostgreSQL implementations.
+    Subclasses provide the dialect's insert function for INSERT ... ON CONFLICT statements,
+    the connection check and full-text search.
+    """
+
+    insert_function = None
+    # Cached kinds about the set of users, dropped when a user is added, renamed or deleted
+    user_query_kinds = ('users', 'user_in_database')
+
+    def __init__(self, db_file_name, db_path, user_model, entry_model, db, catalog_model, query_cache=None):
+        self.db_file_name = db_file_name
+        self.db_path = db_path
+        self.user_model = user_model
+        self.entry_model = entry_model
+        self.catalog_model = catalog_model
+        self.db = db
+        self.query_cache = query_cache
+        self.write_listeners = []
+
+
+    def add_write_listener(self, listener):
+
+        """Registers a callback called with the user ID after every committed change to that user's library."""
+
+        self.write_listeners.append(listener)
+
+
+    def notify_write(self, user_id):
+        if self.query_cache is not None:
+            self.query_cache.invalidate_user(user_id)
+        for listener in self.write_listeners:
+            listener(user_id)
+
+
+    def invalidate_users(self):
+        if self.query_cache is not None:
+            self.query_cache.invalidate_users(self.user_query_kinds)
+
+
+    def cached(self, key, load):
+
+        """Returns the result of load through the query cache, or loads it directly without one.
+        load must return an immutable snapshot."""
+
+        if self.query_cache is None:
+            return load()
+        return self.query_cache.get_or_load(key, load)
+
+
+    def get_all_users(self):
+
+        """Retrieves snapshots of all user accounts from the database."""
+
+        query = self.db.select(self.user_model.id, self.user_model.name)
+        return self.cached(('users', None), lambda: tuple(
+            UserSnapshot(*row) for row in self.db.session.execute(query.execution_options(yield_per=PROJECTION_BATCH))))
+
+
+    def get_library_version(self, user_id):
+
+        """Returns the library version and the time of the last change of a user, or None if there is no such user."""
+
+        return self.db.session.execute(self.db.select(self.user_model.library_version, self.user_model.updated_at)
+                                       .where(self.user_model.id == user_id)).first()
+
+
+    def get_users_version(self):
+
+        """Returns the number of users, the highest user ID and the latest time a user was added or renamed,
+        which together change whenever a user is added, renamed or deleted, but not on library changes."""
+
+        return self.db.session.execute(self.db.select(func.count(self.user_model.id), func.max(self.user_model.id),
+                                                      func.max(self.user_model.name_changed_at))).first()
+
+
+    def bump_library_version(self, user_ids):
+
+        """Increments the library version of the given users (a list of IDs or a query of them)
+        in the current transaction, so pages and ETags derived from the old version become stale."""
+
+        user = self.user_model
+        self.db.session.execute(update(user).where(user.id.in_(user_ids))
+                                .values(library_version=user.library_version + 1, updated_at=datetime.now())
+                                .execution_options(synchronize_session=False))
+
+
+    def select_movies(self):
+
+        """
+        Returns a projection query of library entries joined with their catalog movies, selecting the fields
+        of MovieSnapshot in order, so rows become snapshots without hydrating ORM objects into the session.
+        Catalog columns can be used for filtering and sorting.
+        """
+
+        entry, catalog = self.entry_model, self.catalog_model
+        return self.db.select(entry.id, entry.user_id, entry.movie_id, catalog.title, catalog.director, catalog.year,
+                              func.coalesce(entry.personal_rating, catalog.rating).label('rating'), catalog.poster,
+                              entry.personal_rating).join_from(entry, catalog, entry.movie)
+
+
+    def get_user_movies(self, user_id):
+
+        """Fetches snapshots of all library entries of a given user together with their catalog movies in one query,
+        streamed from the database in batches of PROJECTION_BATCH rows."""
+
+        query = self.select_movies().where(self.entry_model.user_id == user_id)\
+            .execution_options(yield_per=PROJECTION_BATCH)
+        return self.cached(('movies', user_id), lambda: tuple(
+            MovieSnapshot(*row) for row in self.db.session.execute(query)))
+
+
+    def get_users_page(self, limit, cursor=None):
+
+        """
+        Retrieves one page of user accounts ordered by name using keyset pagination.
+        Returns the users and the cursor of the next page, or None on the last page.
+        Raises ValueError if the cursor is malformed.
+        """
+
+        query = self.db.select(self.user_model.id, self.user_model.name).order_by(self.user_model.name,
+                                                                                   self.user_model.id)
+        if cursor:
+            last_name, last_id = self._cursor_values(cursor, 'users', str)
+            query = query.where(or_(self.user_model.name > last_name,
+                                    and_(self.user_model.name == last_name, self.user_model.id > last_id)))
+        users = [UserSnapshot(*row) for row in self.db.session.execute(query.limit(limit + 1))]
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = encode_cursor(['users', users[-1].name, users[-1].id])
+        return users, next_cursor
+
+
+    def stream_library(self, user_id=None):
+
+        """
+        Yields the user name and a snapshot of every library entry of one user, or of all users, ordered by user
+        and entry. Rows are fetched in batches of PROJECTION_BATCH from a server-side cursor and are not cached,
+        so memory use does not grow with the size of the export.
+        """
+
+        entry = self.entry_model
+        query = self.select_movies().add_columns(self.user_model.name)\
+            .join(self.user_model, self.user_model.id == entry.user_id).order_by(entry.user_id, entry.id)\
+            .execution_options(yield_per=PROJECTION_BATCH)
+        if user_id is not None:
+            query = query.where(entry.user_id == user_id)
+        for row in self.db.session.execute(query):
+            yield row[-1], MovieSnapshot(*row[:-1])
+
+
+    def get_user_movies_page(self, user_id, limit, cursor=None, sort='title', descending=False,
+                             director=None, year_from=None, year_to=None):
+
+        """
+        Retrieves one page of a user's library entries using keyset pagination.
+        Entries are sorted by title, year or rating (the personal rating when set, missing values sort first)
+        with the entry ID as a tie-breaker, and can be filtered by director (case-insensitive substring) and a year range.
+        Returns the movies and the cursor of the next page, or None on the last page.
+        Raises ValueError if the sort key is unknown or the cursor is malformed or belongs to another sort.
+        """
+
+        catalog = self.catalog_model
+        sort_keys = {
+            'title': catalog.title,
+            'year': func.coalesce(catalog.year, 0),
+            'rating': func.coalesce(self.entry_model.personal_rating, catalog.rating, -1)
+        }
+        if sort not in sort_keys:
+            raise ValueError(f"Unknown sort key: {sort}")
+        sort_key = sort_keys[sort]
+        sort_types = {'title': str, 'year': int, 'rating': (int, float)}[sort]
+        movie_id = self.entry_model.id
+        query = self.select_movies().add_columns(sort_key).where(self.entry_model.user_id == user_id)
+        if director:
+            query = query.where(catalog.director.icontains(director, autoescape=True))
+        if year_from:
+            query = query.where(catalog.year >= year_from)
+        if year_to:
+            query = query.where(catalog.year <= year_to)
+        if cursor:
+            last_key, last_id = self._cursor_values(cursor, f"{sort}:{int(descending)}", sort_types)
+            if descending:
+                query = query.where(or_(sort_key < last_key, and_(sort_key == last_key, movie_id < last_id)))
+            else:
+                query = query.where(or_(sort_key > last_key, and_(sort_key == last_key, movie_id > last_id)))
+        if descending:
+            query = query.order_by(sort_key.desc(), movie_id.desc())
+        else:
+            query = query.order_by(sort_key, movie_id)
+        rows = self.db.session.execute(query.limit(limit + 1)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([f"{sort}:{int(descending)}", rows[-1][-1], rows[-1].id])
+        return [MovieSnapshot(*row[:-1]) for row in rows], next_cursor
+
+
+    @staticmethod
+    def _cursor_values(cursor, scope, value_types):
+
+        """Returns the (sort value, ID) pair stored in a cursor created for the given scope.
+        Raises ValueError unless the sort value is one of value_types and the ID is an integer."""
+
+        values = decode_cursor(cursor)
+        if len(values) != 3 or values[0] != scope:
+            raise ValueError('The cursor belongs to another listing')
+        _, last_key, last_id = values
+        if isinstance(last_key, bool) or not isinstance(last_key, value_types) \
+                or isinstance(last_id, bool) or not isinstance(last_id, int):
+            raise ValueError('Malformed cursor: unexpected value types')
+        return last_key, last_id
+
+
+    def get_movie_by_id(self, movie_id):
+
+        """Retrieves a snapshot of a library entry with its catalog movie by the entry ID, or None."""
+
+        def load():
+            row = self.db.session.execute(self.select_movies().where(self.entry_model.id == movie_id)).first()
+            return MovieSnapshot(*row) if row is not None else None
+
+        return self.cached(('movie', None, movie_id), load)
+
+
+    def add_user(self, name):
+
+        """Creates and adds a new user account with the given name to the database and returns its ID."""
+
+        user = self.user_model(
+            name=name,
+        )
+        self.db.session.add(user)
+        self.db.session.commit()
+        self.invalidate_users()
+        return user.id
+
+
+    def delete_user(self, user_id):
+
+        """Deletes the user account identified by the given user ID from the database."""
+
+        user = self.db.session.get(self.user_model, user_id)
+        self.db.session.delete(user)
+        self.db.session.flush()
+        self.delete_orphaned_movies()
+        self.db.session.commit()
+        self.invalidate_users()
+        self.notify_write(user_id)
+
+
+    def update_user(self, user_id, new_name):
+
+        """Updates the name of an existing user account specified by the user ID."""
+
+        user = self.db.session.get(self.user_model, user_id)
+        user.name = new_name
+        user.name_changed_at = datetime.now()
+        self.bump_library_version([user_id])
+        self.db.session.commit()
+        self.invalidate_users()
+
+
+    def find_or_add_catalog_movie(self, title, director, year, rating, poster):
+
+        """
+        Returns the catalog movie with the given title, director, year and poster, preferring movies fetched
+        from OMDb, or adds a new one without an IMDb ID, so every distinct version of a movie is stored once.
+        """
+
+        catalog = self.catalog_model
+        title_key = normalize_title(title)
+        query = self.db.select(catalog).where(catalog.title_key == title_key, catalog.title == title,
+                                              catalog.director == director, catalog.year == year,
+                                              catalog.poster == poster)\
+            .order_by(catalog.imdb_id.is_(None), catalog.id).limit(1)
+        movie = self.db.session.execute(query).scalar()
+        if movie is None:
+            movie = catalog(title=title, title_key=title_key, director=director, year=year, rating=rating,
+                            poster=poster, fetched_at=datetime.now())
+            self.db.session.add(movie)
+            self.db.session.flush()
+        return movie
+
+
+    @staticmethod
+    def personal_rating(movie, rating):
+
+        """Returns the rating to store for the user, or None if it is the same as the catalog rating."""
+
+        return None if rating == movie.rating else rating
+
+
+    def add_movie(self, title, user_id, director, year, rating, poster):
+
+        """Adds a movie to a user's library, reusing the catalog movie with the same metadata if there is one.
+        Raises IntegrityError if the movie is already in the user's library."""
+
+        try:
+            movie = self.find_or_add_catalog_movie(title, director, year, rating, poster)
+            entry = self.entry_model(user_id=user_id, movie=movie, personal_rating=self.personal_rating(movie, rating))
+            self.db.session.add(entry)
+            self.bump_library_version([user_id])
+            self.db.session.commit()
+        except exc.IntegrityError:
+            self.db.session.rollback()
+            raise
+        self.notify_write(user_id)
+
+
+    def add_movies(self, user_id, movies, skip_existing=False):
+
+        """Adds several movies to a user's library in a single transaction: catalog movies are looked up
+        or added first, then the library entries are written with one multi-row insert.
+        Every movie is a dict with title, director, year, rating and poster keys.
+        Returns the IDs of the new library entries in the order of the movies. With skip_existing, movies
+        already in the library are left out with ON CONFLICT DO NOTHING instead of raising IntegrityError."""
+
+        if not movies:
+            return []
+        try:
+            rows = []
+            for data in movies:
+                movie = self.find_or_add_catalog_movie(data['title'], data['director'], data['year'],
+                                                       data['rating'], data['poster'])
+                rows.append({'user_id': user_id, 'movie_id': movie.id,
+                             'personal_rating': self.personal_rating(movie, data['rating'])})
+            statement = insert(self.entry_model)
+            if skip_existing:
+                statement = self.insert_function(self.entry_model)\
+                    .on_conflict_do_nothing(index_elements=['user_id', 'movie_id'])
+            ids = self.db.session.scalars(
+                statement.returning(self.entry_model.id, sort_by_parameter_order=not skip_existing), rows).all()
+            self.bump_library_version([user_id])
+            self.db.session.commit()
+        except exc.IntegrityError:
+            self.db.session.rollback()
+            raise
+        self.notify_write(user_id)
+        return ids
+
+
+    def delete_movie(self, movie_id):
+
+        """Removes a library entry by its ID, together with its catalog movie if it was the user's own copy."""
+
+        entry = self.db.session.get(self.entry_model, movie_id)
+        user_id = entry.user_id
+        self.db.session.delete(entry)
+        self.db.session.flush()
+        self.delete_orphaned_movies()
+        self.bump_library_version([user_id])
+        self.db.session.commit()
+        self.notify_write(user_id)
+
+
+    def delete_movies(self, user_id, movie_ids):
+
+        """Removes several library entries of a user in a single transaction, together with the catalog movies
+        that were the user's own copies. Raises ValueError without deleting anything
+        if an entry is not in the user's library."""
+
+        entries = self.get_user_entries(user_id, movie_ids)
+        for entry in entries.values():
+            self.db.session.delete(entry)
+        self.db.session.flush()
+        self.delete_orphaned_movies()
+        self.bump_library_version([user_id])
+        self.db.session.commit()
+        self.notify_write(user_id)
+
+
+    def get_user_entries(self, user_id, movie_ids):
+
+        """Loads the library entries with the given IDs and their catalog movies, keyed by entry ID.
+        Raises ValueError if any of them does not exist or belongs to another user."""
+
+        entry = self.entry_model
+        query = self.db.select(entry).where(entry.id.in_(movie_ids), entry.user_id == user_id)\
+            .options(joinedload(entry.movie))
+        entries = {item.id: item for item in self.db.session.execute(query).scalars()}
+        missing = [movie_id for movie_id in movie_ids if movie_id not in entries]
+        if missing:
+            raise ValueError(f"Movies not found in the library: {', '.join(map(str, missing))}")
+        return entries
+
+
+    def change_entry(self, entry, title, director, year, rating, poster):
+
+        """
+        Applies new movie data to a library entry without committing.
+        A changed rating is stored as the user's personal rating; changed metadata is copied on write
+        into another catalog movie, so the shared movie seen by other users stays untouched.
+        Raises IntegrityError if a new title is the title of another movie in the user's library.
+        """
+
+        movie = entry.movie
+        if movie.title_key != normalize_title(title):
+            self.check_title_available(entry, title)
+        if (movie.title, movie.director, movie.year, movie.poster) != (title, director, year, poster):
+            movie = self.find_or_add_catalog_movie(title, director, year, rating, poster)
+            entry.movie = movie
+        entry.personal_rating = self.personal_rating(movie, rating)
+
+
+    def check_title_available(self, entry, title):
+
+        """Raises IntegrityError if another entry of the entry's user has a movie with the same normalized title,
+        since the unique index only covers (user_id, movie_id) and edited metadata lives in separate catalog movies."""
+
+        query = self.db.select(self.entry_model.id).join(self.entry_model.movie)\
+            .where(self.entry_model.user_id == entry.user_id, self.entry_model.id != entry.id,
+                   self.catalog_model.title_key == normalize_title(title))
+        if self.db.session.scalar(self.db.select(query.exists())):
+            raise exc.IntegrityError(str(query), {'user_id': entry.user_id, 'title': title},
+                                     ValueError('The movie is already in the library'))
+
+
+    def update_movies(self, user_id, updates):
+
+        """
+        Updates several library entries of a user in a single transaction.
+        Every update is a dict with the entry 'id' and any of the title, director, year, rating and poster keys;
+        missing keys keep their current values. Raises ValueError if an entry is not in the user's library
+        and IntegrityError if the user already has one of the resulting movies; nothing is updated then.
+        """
+
+        entries = self.get_user_entries(user_id, [data['id'] for data in updates])
+        try:
+            for data in updates:
+                entry = entries[data['id']]
+                values = {'title': entry.title, 'director': entry.director, 'year': entry.year,
+                          'rating': entry.rating, 'poster': entry.poster}
+                values.update((key, data[key]) for key in values if key in data)
+                self.change_entry(entry, **values)
+            self.db.session.flush()
+            self.delete_orphaned_movies()
+            self.bump_library_version([user_id])
+            self.db.session.commit()
+        except exc.IntegrityError:
+            self.db.session.rollback()
+            raise
+        self.notify_write(user_id)
+
+
+    def update_movie(self, movie_id, title, director, year, rating, poster):
+
+        """
+        Updates a library entry with new title, director, year, rating and poster (see change_entry).
+        Raises IntegrityError if the user already has the resulting movie.
+        """
+
+        entry = self.db.session.get(self.entry_model, movie_id)
+        try:
+            self.change_entry(entry, title, director, year, rating, poster)
+            self.db.session.flush()
+            self.delete_orphaned_movies()
+            self.bump_library_version([entry.user_id])
+            self.db.session.commit()
+        except exc.IntegrityError:
+            self.db.session.rollback()
+            raise
+        self.notify_write(entry.user_id)
+
+
+    def delete_orphaned_movies(self):
+
+        """Deletes catalog movies that did not come from OMDb and are no longer in any library."""
+
+        catalog = self.catalog_model
+        in_library = self.db.select(self.entry_model.id).where(self.entry_model.movie_id == catalog.id).exists()
+        self.db.session.execute(delete(catalog).where(catalog.imdb_id.is_(None), ~in_library)
+                                .execution_options(synchronize_session=False))
+
+
+    def user_in_database(self, user_name):
+
+        """Checks if a user with the specified name exists in the database
+        with an EXISTS probe on the unique name index."""
+
+        query = self.db.select(self.user_model.id).where(self.user_model.name == user_name)
+        return self.cached(('user_in_database', None, user_name),
+                           lambda: self.db.session.scalar(self.db.select(query.exists())))
+
+
+    def movie_in_database(self, movie_title, user_id):
+
+        """Checks if a movie with the specified title is in the given user's library
+        with an EXISTS probe joining the library entries to the catalog.
+        Titles are compared by their normalized key, so case and whitespace do not matter."""
+
+        title_key = normalize_title(movie_title)
+        query = self.db.select(self.entry_model.id).join(self.entry_model.movie)\
+            .where(self.catalog_model.title_key == title_key, self.entry_model.user_id == user_id)
+        return self.cached(('movie_in_database', user_id, title_key),
+                           lambda: self.db.session.scalar(self.db.select(query.exists())))
+
+
+    def get_user_movie_titles(self, user_id):
+
+        """Returns the titles of all movies of the given user, fetched with a single query."""
+
+        return self.cached(('titles', user_id), lambda: frozenset(
+            self.db.session.execute(self.db.select(self.catalog_model.title).join(self.catalog_model.entries)
+                                    .where(self.entry_model.user_id == user_id)).scalars()))
+
+
+    def get_catalog_movie(self, title_key):
+
+        """Returns the most recently fetched OMDb movie with the given normalized title from the catalog, or None."""
+
+        return self.db.session.execute(self.db.select(self.catalog_model)\
+                                       .where(self.catalog_model.title_key == title_key,
+                                              self.catalog_model.imdb_id.is_not(None))\
+                                       .order_by(self.catalog_model.fetched_at.desc()).limit(1)).scalar()
+
+
+    def save_catalog_movies(self, movies):
+
+        """
+        Inserts catalog movies or updates the existing ones with the same IMDb ID in a single transaction,
+        bumping the library version of every user who has one of the updated movies and notifying their change.
+        Every movie is a dict with imdb_id, title, title_key, director, year, rating, poster and fetched_at keys.
+        """
+
+        if not movies:
+            return
+        statement = self.upsert_statement(self.catalog_model, ['imdb_id'])
+        self.db.session.execute(statement, movies)
+        imdb_ids = [movie['imdb_id'] for movie in movies]
+        owners = self.db.session.execute(self.db.select(self.entry_model.user_id).distinct()
+                                         .join(self.entry_model.movie)
+                                         .where(self.catalog_model.imdb_id.in_(imdb_ids))).scalars().all()
+        if owners:
+            self.bump_library_version(owners)
+        self.db.session.commit()
+        for user_id in owners:
+            self.notify_write(user_id)
+
+
+    def upsert_statement(self, model, index_elements):
+
+        """Builds an INSERT ... ON CONFLICT DO UPDATE statement replacing every column but the key and the ID."""
+
+        statement = self.insert_function(model)
+        updated = {column.name: statement.excluded[column.name] for column in model.__table__.columns
+                   if column.name not in index_elements and not column.primary_key}
+        return statement.on_conflict_do_update(index_elements=index_elements, set_=updated)
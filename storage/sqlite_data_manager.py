@@ -1,21 +1,25 @@
-from storage.data_manager_interface import DataManagerInterface
-from sqlalchemy import text, exc
+from storage.sql_data_manager import SQLDataManager
+from storage.engine_config import get_sqlite_pragmas, expected_pragma_value
+from storage.search import build_match_query, SEARCH_INDEX_STATEMENTS, SEARCH_RANK
+from storage.snapshots import MovieSnapshot
+from sqlalchemy import text, exc, table, column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import os
 
+SEARCH_TABLE = table('movie_fts', column('rowid'))
 
-class SQLiteDataManager(DataManagerInterface):
-    def __init__(self, db_file_name, db_path, user_model, movie_model, db):
-        self.db_file_name = db_file_name
-        self.db_path = db_path
-        self.user_model = user_model
-        self.movie_model = movie_model
-        self.db = db
+
+class SQLiteDataManager(SQLDataManager):
+
+    """SQLite implementation of the data manager, searching with an FTS5 index kept in sync by triggers."""
+
+    insert_function = staticmethod(sqlite_insert)
 
 
     def check_database_connection(self):
 
-        """Checks if the database file exists and verifies
-        that a connection to the database can be established."""
+        """Checks if the database file exists, verifies that a connection to the database
+        can be established and reports which of the configured pragmas are actually in effect."""
 
         if not os.path.exists(self.db_path):
             print(f"Database file was not found: {self.db_path}")
@@ -23,118 +27,52 @@ class SQLiteDataManager(DataManagerInterface):
         try:
             self.db.session.execute(text('SELECT 1'))
             print('Connection established')
+            self.report_pragmas()
             return True
         except (exc.OperationalError, Exception) as e:
             print(f"Impossible to connect with the database: {e}")
             return False
 
 
-    def get_all_users(self):
-
-        """Retrieves all user accounts from the database."""
-
-        return self.db.session.execute(self.db.select(self.user_model)).scalars()
-
-
-    def get_user_movies(self, user_id):
-
-        """Fetches all movies associated with a given user ID from the database."""
-
-        return self.db.session.execute(self.db.select(self.movie_model)\
-                                       .where(self.movie_model.user_id == user_id)).scalars()
-
-
-    def get_movie_by_id(self, movie_id):
-
-        """Retrieves a movie record from the database by its movie ID."""
-
-        return self.db.session.get(self.movie_model, movie_id)
-
-
-    def add_user(self, name):
-
-        """Creates and adds a new user account with the given name to the database."""
-
-        user = self.user_model(
-            name=name,
-        )
-        self.db.session.add(user)
-        self.db.session.commit()
-
-
-    def delete_user(self, user_id):
-
-        """Deletes the user account identified by the given user ID from the database."""
+    def report_pragmas(self):
 
-        user = self.db.session.get(self.user_model, user_id)
-        self.db.session.delete(user)
-        self.db.session.commit()
-
-
-    def update_user(self, user_id, new_name):
+        """Prints the value of every configured SQLite pragma and warns about the ones not in effect.
+        Returns a dict mapping each pragma to its actual value."""
 
-        """Updates the name of an existing user account specified by the user ID."""
-
-        user = self.db.session.get(self.user_model, user_id)
-        user.name = new_name
-        self.db.session.commit()
+        pragmas = {}
+        for name, value in get_sqlite_pragmas().items():
+            actual = self.db.session.execute(text(f"PRAGMA {name}")).scalar()
+            pragmas[name] = actual
+            if str(actual).lower() == expected_pragma_value(name, value):
+                print(f"SQLite pragma {name} = {actual}")
+            else:
+                print(f"SQLite pragma {name} = {actual} (configured: {value})")
+        return pragmas
 
 
-    def add_movie(self, title, user_id, director, year, rating, poster):
+    def search_movies(self, query, user_id=None, limit=50):
 
-        """Adds a new movie record with the provided details for a specific user to the database."""
+        """
+        Searches catalog titles and directors with the FTS5 index using prefix matching,
+        either in one user's library or across all users.
+        Returns the best matching library entries first, title matches ranking above director matches.
+        """
 
-        movie = self.movie_model(
-            title=title,
-            director=director,
-            year=year,
-            rating=rating,
-            poster=poster,
-            user_id=user_id
-        )
-        self.db.session.add(movie)
-        self.db.session.commit()
-
-
-    def delete_movie(self, movie_id):
-
-        """Removes a movie record from the database using the specified movie ID."""
-
-        movie = self.db.session.get(self.movie_model, movie_id)
-        self.db.session.delete(movie)
-        self.db.session.commit()
+        match = build_match_query(query)
+        if not match:
+            return []
+        statement = self.select_movies().join(SEARCH_TABLE, SEARCH_TABLE.c.rowid == self.catalog_model.id)\
+            .where(text('movie_fts MATCH :match')).order_by(text(SEARCH_RANK)).limit(limit)
+        if user_id is not None:
+            statement = statement.where(self.entry_model.user_id == user_id)
+        return [MovieSnapshot(*row) for row in self.db.session.execute(statement, {'match': match})]
 
 
-    def update_movie(self, movie_id, title, director, year, rating, poster):
+    def rebuild_search_index(self):
 
-        """Updates an existing movie record with new information
-        including title, director, year, rating, and poster."""
+        """Creates the full-text search table and its sync triggers if they are missing
+        and rebuilds the index from the existing catalog movies."""
 
-        movie = self.db.session.get(self.movie_model, movie_id)
-        movie.title = title
-        movie.director = director
-        movie.year = year
-        movie.rating = rating
-        movie.poster = poster
+        for statement in SEARCH_INDEX_STATEMENTS:
+            self.db.session.execute(text(statement))
         self.db.session.commit()
-
-
-    def user_in_database(self, user_name):
-
-        """Checks if a user with the specified name exists in the database."""
-
-        if not self.db.session.execute(self.db.select(self.user_model)\
-                                               .where(self.user_model.name == user_name)).all():
-            return False
-        return True
-
-
-    def movie_in_database(self, movie_title, user_id):
-
-        """Checks if a movie with the specified title exists for the given user ID in the database."""
-
-        if not self.db.session.execute(self.db.select(self.movie_model)\
-                                               .where(self.movie_model.title == movie_title,
-                                                     self.movie_model.user_id == user_id)).all():
-            return False
-        return True
@@ -0,0 +1,75 @@
+from storage.db_models import UserAccount, LibraryEntry, CatalogMovie, db
+from storage.sqlite_data_manager import SQLiteDataManager
+from storage.postgres_data_manager import PostgreSQLDataManager
+from storage.engine_config import register_sqlite_pragmas
+from storage.cache import QueryCache
+from sqlalchemy.engine import make_url
+from flask import Flask
+import os
+import pytest
+
+register_sqlite_pragmas()
+
+
+def postgresql_url():
+
+    """Returns the PostgreSQL URL from DATABASE_URL with the psycopg driver, or None if it is not set to one.
+    The database must be disposable: the tests create and drop all tables in it."""
+
+    url = os.getenv('DATABASE_URL')
+    if not url or make_url(url).get_backend_name() != 'postgresql':
+        return None
+    return make_url(url).set(drivername='postgresql+psycopg').render_as_string(hide_password=False)
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def data_manager(request, tmp_path):
+
+    """Yields a data manager on an empty database inside an application context,
+    once for SQLite and once for PostgreSQL when DATABASE_URL points to one."""
+
+    if request.param == 'sqlite':
+        db_path = str(tmp_path / 'data.db')
+        url, manager_class = f"sqlite:///{db_path}", SQLiteDataManager
+    else:
+        db_path, url, manager_class = None, postgresql_url(), PostgreSQLDataManager
+        if url is None:
+            pytest.skip('DATABASE_URL does not point to a PostgreSQL database')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    db.init_app(app)
+    manager = manager_class(url, db_path, user_model=UserAccount, entry_model=LibraryEntry, db=db,
+                            catalog_model=CatalogMovie, query_cache=QueryCache(max_size=64, ttl=60))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        manager.rebuild_search_index()
+        yield manager
+        db.session.rollback()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def web_app(tmp_path_factory):
+
+    """Imports the application on a fresh SQLite database, ignoring DATABASE_URL, and returns the app module."""
+
+    database_url = os.environ.pop('DATABASE_URL', None)
+    os.environ['DB_PATH'] = str(tmp_path_factory.mktemp('app') / 'data.db')
+    os.environ.setdefault('SECRET_KEY', 'test')
+    os.environ.setdefault('GEMINI_API_KEY', 'test')
+    try:
+        import app
+    finally:
+        if database_url is not None:
+            os.environ['DATABASE_URL'] = database_url
+    with app.app.app_context():
+        app.data_manager.db.create_all()
+        app.data_manager.rebuild_search_index()
+    return app
+
+
+@pytest.fixture
+def client(web_app):
+    return web_app.app.test_client()
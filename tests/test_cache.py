@@ -0,0 +1,155 @@
+from storage.cache import LRUCache, SQLiteCache, TieredCache, QueryCache
+from storage.snapshots import MovieSnapshot
+from storage import cache
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    monkeypatch.setattr(cache.time, 'time', clock)
+    return clock
+
+
+def test_lru_evicts_the_least_recently_used_entry(clock):
+    lru = LRUCache(max_size=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert (lru.get('a'), lru.get('b'), lru.get('c')) == (1, None, 3)
+    assert len(lru) == 2
+    assert lru.stats.as_dict() == {'hits': 3, 'misses': 1, 'evictions': 1, 'hit_ratio': 0.75}
+
+
+def test_lru_expires_entries(clock):
+    lru = LRUCache(ttl=10)
+    lru.set('a', 1)
+    lru.set('b', 2, ttl=30)
+    clock.now += 11
+    assert (lru.get('a'), lru.get('b')) == (None, 2)
+    assert len(lru) == 1
+
+
+def test_sqlite_cache_persists_json_values(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    SQLiteCache(path).set('heat', {'Title': 'Heat', 'Year': '1995'})
+    disk = SQLiteCache(path, ttl=10)
+    assert disk.get('heat') == {'Title': 'Heat', 'Year': '1995'}
+    disk.set('up', ['Up'])
+    clock.now += 11
+    assert disk.get('up') is None
+    assert disk.stats.as_dict()['misses'] == 1
+
+
+def test_sqlite_cache_trims_to_max_size(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / 'cache.db'), max_size=2)
+    for number, key in enumerate(('a', 'b', 'c')):
+        clock.now += 1
+        disk.set(key, number)
+    assert (disk.get('a'), disk.get('b'), disk.get('c')) == (None, 1, 2)
+    assert disk.stats.evictions == 1
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / 'cache.db'))
+    disk.set('heat', 'Heat')
+    tiered = TieredCache(LRUCache(), disk)
+    assert tiered.get('heat') == 'Heat'
+    assert tiered.memory.get('heat') == 'Heat'
+    tiered.delete('heat')
+    assert tiered.get('heat') is None
+    assert set(tiered.stats()) == {'memory', 'disk'}
+
+
+def test_delete_matching_drops_one_users_recommendations(clock):
+    lru = LRUCache()
+    lru.set(('1', 'library', 'happy'), ['Up'])
+    lru.set(('1', 'library', 'sad'), ['Heat'])
+    lru.set(('12', 'library', 'happy'), ['Jaws'])
+    lru.delete_matching(lambda key: key[0] == '1')
+    assert lru.get(('1', 'library', 'happy')) is None and lru.get(('1', 'library', 'sad')) is None
+    assert lru.get(('12', 'library', 'happy')) == ['Jaws']
+
+
+def test_query_cache_loads_once(clock):
+    queries = QueryCache()
+    loads = []
+    load = lambda: loads.append(1) or ('ann', 'bob')
+    assert queries.get_or_load(('users', None), load) == ('ann', 'bob')
+    assert queries.get_or_load(('users', None), load) == ('ann', 'bob')
+    assert len(loads) == 1
+    assert queries.get_or_load(('movie', None, 9), lambda: None) is None
+    assert len(queries.entries) == 1
+
+
+def test_query_cache_invalidates_one_user(clock):
+    queries = QueryCache()
+    movie = MovieSnapshot(7, 1, 3, 'Heat', 'Michael Mann', 1995, 8.3, None, None)
+    queries.get_or_load(('movies', 1), lambda: (movie,))
+    queries.get_or_load(('movie', None, 7), lambda: movie)
+    queries.get_or_load(('movies', 2), lambda: ())
+    queries.get_or_load(('users', None), lambda: ())
+    queries.invalidate_user(1)
+    assert queries.entries.get(('movies', 1)) is None and queries.entries.get(('movie', None, 7)) is None
+    assert queries.entries.get(('movies', 2)) == () and queries.entries.get(('users', None)) == ()
+    queries.invalidate_users(('users',))
+    assert queries.entries.get(('users', None)) is None and queries.entries.get(('movies', 2)) == ()
+
+
+def test_query_cache_keeps_single_movies_when_users_change(clock):
+    queries = QueryCache()
+    movie = MovieSnapshot(7, 1, 3, 'Heat', 'Michael Mann', 1995, 8.3, None, None)
+    queries.get_or_load(('movie', None, 7), lambda: movie)
+    queries.get_or_load(('users', None), lambda: ())
+    queries.invalidate_users(('users',))
+    assert queries.entries.get(('movie', None, 7)) is movie and queries.entries.get(('users', None)) is None
+
+
+def test_query_cache_skips_results_loaded_during_a_write(clock):
+    queries = QueryCache()
+
+    def load():
+        queries.invalidate_user(1)
+        return ('stale',)
+
+    assert queries.get_or_load(('movies', 1), load) == ('stale',)
+    assert queries.get_or_load(('movies', 1), lambda: ('fresh',)) == ('fresh',)
+
+
+def test_tiered_cache_keeps_the_disk_expiry(tmp_path, clock):
+    disk = SQLiteCache(str(tmp_path / 'cache.db'))
+    disk.set('nope', {'Response': 'False'}, ttl=60)
+    clock.now += 50
+    tiered = TieredCache(LRUCache(ttl=3600), disk)
+    assert tiered.get('nope') == {'Response': 'False'}
+    clock.now += 11
+    assert tiered.memory.get('nope') is None
+
+
+def test_sqlite_cache_closes_its_connections(tmp_path, monkeypatch):
+    opened = []
+    connect = cache.sqlite3.connect
+
+    def tracked_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(cache.sqlite3, 'connect', tracked_connect)
+    disk = SQLiteCache(str(tmp_path / 'cache.db'))
+    disk.set('heat', 'Heat')
+    assert disk.get('heat') == 'Heat'
+    disk.delete('heat')
+    disk.clear()
+    for connection in opened:
+        with pytest.raises(cache.sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
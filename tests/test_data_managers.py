@@ -0,0 +1,137 @@
+from storage.pagination import encode_cursor
+from sqlalchemy import exc
+import pytest
+
+
+def add_movies(data_manager, user_id, *titles):
+    for number, title in enumerate(titles):
+        data_manager.add_movie(title, user_id, f"Director {number}", 1990 + number, 5.0 + number, None)
+
+
+def test_add_movie(data_manager):
+    user_id = data_manager.add_user('ann')
+    data_manager.add_movie('Heat', user_id, 'Michael Mann', 1995, 8.3, 'http://posters/heat.jpg')
+    [movie] = data_manager.get_user_movies(user_id)
+    assert (movie.title, movie.director, movie.year, movie.rating, movie.poster) == \
+           ('Heat', 'Michael Mann', 1995, 8.3, 'http://posters/heat.jpg')
+    assert data_manager.movie_in_database('Heat', user_id)
+    assert data_manager.movie_in_database('  HEAT ', user_id)
+    assert not data_manager.movie_in_database('Heat 2', user_id)
+    assert data_manager.get_library_version(user_id)[0] == 1
+
+
+def test_add_movie_shares_the_catalog_movie(data_manager):
+    ann, bob = data_manager.add_user('ann'), data_manager.add_user('bob')
+    data_manager.add_movie('Heat', ann, 'Michael Mann', 1995, 8.3, None)
+    data_manager.add_movie('Heat', bob, 'Michael Mann', 1995, 7.0, None)
+    [ann_movie], [bob_movie] = data_manager.get_user_movies(ann), data_manager.get_user_movies(bob)
+    assert ann_movie.movie_id == bob_movie.movie_id
+    assert (ann_movie.rating, bob_movie.rating) == (8.3, 7.0)
+
+
+def test_duplicate_movie_is_rejected(data_manager):
+    user_id = data_manager.add_user('ann')
+    data_manager.add_movie('Heat', user_id, 'Michael Mann', 1995, 8.3, None)
+    with pytest.raises(exc.IntegrityError):
+        data_manager.add_movie('Heat', user_id, 'Michael Mann', 1995, 8.3, None)
+    with pytest.raises(exc.IntegrityError):
+        data_manager.add_movies(user_id, [{'title': 'Alien', 'director': None, 'year': 1979, 'rating': 8.5,
+                                           'poster': None},
+                                          {'title': 'Heat', 'director': 'Michael Mann', 'year': 1995,
+                                           'rating': 8.3, 'poster': None}])
+    assert [movie.title for movie in data_manager.get_user_movies(user_id)] == ['Heat']
+    assert data_manager.add_movies(user_id, [{'title': 'Heat', 'director': 'Michael Mann', 'year': 1995,
+                                              'rating': 8.3, 'poster': None}], skip_existing=True) == []
+
+
+def test_search_ranks_title_matches_first(data_manager):
+    ann, bob = data_manager.add_user('ann'), data_manager.add_user('bob')
+    data_manager.add_movie('Dunkirk', ann, 'Christopher Nolan', 2017, 7.8, None)
+    data_manager.add_movie('The Dark Knight', ann, 'Christopher Nolan', 2008, 9.0, None)
+    data_manager.add_movie('Heat', bob, 'Michael Mann', 1995, 8.3, None)
+    assert [movie.title for movie in data_manager.search_movies('dark kni')] == ['The Dark Knight']
+    assert [movie.title for movie in data_manager.search_movies('nolan')] == ['Dunkirk', 'The Dark Knight']
+    assert [movie.title for movie in data_manager.search_movies('heat', user_id=ann)] == []
+    assert [movie.title for movie in data_manager.search_movies('heat', user_id=bob)] == ['Heat']
+    assert data_manager.search_movies('%') == []
+
+
+@pytest.mark.parametrize('sort, descending', [('title', False), ('year', True), ('rating', True)])
+def test_pages_cover_the_library_once(data_manager, sort, descending):
+    user_id = data_manager.add_user('ann')
+    add_movies(data_manager, user_id, 'Eve', 'Alien', 'Heat', 'Jaws', 'Up', 'Cars', 'Brazil')
+    expected = sorted(data_manager.get_user_movies(user_id), key=lambda movie: getattr(movie, sort),
+                      reverse=descending)
+    listed, cursor = [], None
+    while True:
+        page, cursor = data_manager.get_user_movies_page(user_id, 3, cursor=cursor, sort=sort, descending=descending)
+        assert len(page) <= 3
+        listed.extend(page)
+        if cursor is None:
+            break
+    assert listed == expected
+
+
+def test_page_cursor_is_bound_to_its_sort(data_manager):
+    user_id = data_manager.add_user('ann')
+    add_movies(data_manager, user_id, 'Alien', 'Heat', 'Jaws')
+    page, cursor = data_manager.get_user_movies_page(user_id, 2)
+    assert [movie.title for movie in page] == ['Alien', 'Heat']
+    with pytest.raises(ValueError):
+        data_manager.get_user_movies_page(user_id, 2, cursor=cursor, sort='year')
+    with pytest.raises(ValueError):
+        data_manager.get_user_movies_page(user_id, 2, sort='length')
+
+
+def test_users_page(data_manager):
+    for name in ('cid', 'ann', 'bob'):
+        data_manager.add_user(name)
+    page, cursor = data_manager.get_users_page(2)
+    assert [user.name for user in page] == ['ann', 'bob']
+    page, cursor = data_manager.get_users_page(2, cursor)
+    assert ([user.name for user in page], cursor) == (['cid'], None)
+
+
+def test_users_version_ignores_library_changes(data_manager):
+    ann = data_manager.add_user('ann')
+    version = tuple(data_manager.get_users_version())
+    data_manager.add_movie('Heat', ann, 'Michael Mann', 1995, 8.3, None)
+    assert tuple(data_manager.get_users_version()) == version
+    data_manager.update_user(ann, 'anna')
+    renamed = tuple(data_manager.get_users_version())
+    assert renamed != version
+    bob = data_manager.add_user('bob')
+    added = tuple(data_manager.get_users_version())
+    assert added != renamed
+    data_manager.delete_user(bob)
+    assert tuple(data_manager.get_users_version()) != added
+
+
+def test_renaming_to_another_title_in_the_library_is_rejected(data_manager):
+    user_id = data_manager.add_user('ann')
+    data_manager.add_movie('Inception', user_id, 'Christopher Nolan', 2010, 8.8, None)
+    data_manager.add_movie('Heat', user_id, 'Michael Mann', 1995, 8.3, None)
+    heat = next(movie for movie in data_manager.get_user_movies(user_id) if movie.title == 'Heat')
+    with pytest.raises(exc.IntegrityError):
+        data_manager.update_movie(heat.id, 'inception', 'Someone Else', 2011, 7.0, None)
+    with pytest.raises(exc.IntegrityError):
+        data_manager.update_movies(user_id, [{'id': heat.id, 'title': 'Inception', 'year': 2011}])
+    assert sorted(movie.title for movie in data_manager.get_user_movies(user_id)) == ['Heat', 'Inception']
+    data_manager.update_movie(heat.id, 'HEAT', 'Michael Mann', 1995, 9.0, None)
+    assert sorted(movie.title for movie in data_manager.get_user_movies(user_id)) == ['HEAT', 'Inception']
+
+
+@pytest.mark.parametrize('values', [['title:0', [1], 1], ['title:0', 'Heat', True], ['title:0', 'Heat', '1'],
+                                    ['year:0', 'x', 1], ['rating:1', False, 1], ['title:0', None, 1]])
+def test_tampered_movie_cursor_raises_value_error(data_manager, values):
+    user_id = data_manager.add_user('ann')
+    with pytest.raises(ValueError):
+        sort, descending = values[0].split(':')
+        data_manager.get_user_movies_page(user_id, 2, cursor=encode_cursor(values), sort=sort,
+                                          descending=descending == '1')
+
+
+@pytest.mark.parametrize('values', [['users', {'a': 1}, 1], ['users', 'ann', 1.5], ['users', 3, 1]])
+def test_tampered_users_cursor_raises_value_error(data_manager, values):
+    with pytest.raises(ValueError):
+        data_manager.get_users_page(2, cursor=encode_cursor(values))
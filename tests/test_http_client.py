@@ -0,0 +1,161 @@
+from network.http_client import HTTPClient, CircuitBreaker, CircuitOpenError, HostCircuitBreakers
+from network import http_client
+import requests
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_client.time, 'monotonic', clock)
+    return clock
+
+
+def upstream(monkeypatch, client, *outcomes):
+
+    """Makes the client's session answer with the given responses or raise the given errors, in turn,
+    and returns the list of requested URLs."""
+
+    calls = []
+    outcomes = list(outcomes)
+
+    def get(url, **kwargs):
+        calls.append(url)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(client.session, 'get', get)
+    return calls
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow_request()
+    clock.now += 29
+    assert not breaker.allow_request()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow_request()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow_request()
+    clock.now += 30
+    assert breaker.allow_request()
+
+
+def test_client_refuses_calls_while_open(monkeypatch, clock):
+    client = HTTPClient(retries=0, breaker=CircuitBreaker(failure_threshold=1))
+    calls = upstream(monkeypatch, client, requests.exceptions.ConnectionError('down'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('http://upstream/')
+    with pytest.raises(CircuitOpenError):
+        client.get('http://upstream/')
+    assert len(calls) == 1
+
+
+def test_client_retries_and_records_one_failure(monkeypatch, clock):
+    client = HTTPClient(retries=2, backoff=0, breaker=CircuitBreaker(failure_threshold=2))
+    calls = upstream(monkeypatch, client, Response(503), requests.exceptions.Timeout('slow'), Response(502))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get('http://upstream/')
+    assert len(calls) == 3
+    assert client.breaker.failures == 1 and client.breaker.state == 'closed'
+
+
+def test_client_closes_the_breaker_after_a_successful_trial(monkeypatch, clock):
+    client = HTTPClient(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    upstream(monkeypatch, client, Response(500), Response(200))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get('http://upstream/')
+    clock.now += 30
+    assert client.get('http://upstream/').status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.TooManyRedirects('loop'),
+                                   requests.exceptions.InvalidURL('bad'), KeyboardInterrupt()])
+def test_errors_not_retried_end_the_half_open_trial(monkeypatch, clock, error):
+    client = HTTPClient(retries=2, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    client.breaker.record_failure()
+    clock.now += 30
+    calls = upstream(monkeypatch, client, error)
+    with pytest.raises(type(error)):
+        client.get('http://upstream/')
+    assert len(calls) == 1
+    assert not client.breaker.trial_in_progress and client.breaker.state == 'open'
+    clock.now += 30
+    assert client.breaker.allow_request()
+
+
+def test_host_breakers_only_suspend_the_failing_host(monkeypatch, clock):
+    client = HTTPClient(retries=0, breaker=HostCircuitBreakers(failure_threshold=1))
+    calls = upstream(monkeypatch, client, requests.exceptions.ConnectionError('down'), Response(200))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('http://dead.example/poster.jpg')
+    with pytest.raises(CircuitOpenError):
+        client.get('http://DEAD.example/other.jpg')
+    assert client.get('http://alive.example/poster.jpg').status_code == 200
+    assert calls == ['http://dead.example/poster.jpg', 'http://alive.example/poster.jpg']
+
+
+def test_host_breakers_keep_the_most_recent_hosts(clock):
+    breakers = HostCircuitBreakers(max_hosts=2)
+    first = breakers.for_url('http://a.example/')
+    breakers.for_url('http://b.example/')
+    assert breakers.for_url('http://a.example/x') is first
+    breakers.for_url('http://c.example/')
+    assert list(breakers.breakers) == ['a.example', 'c.example']
+
+
+def test_client_closes_the_responses_it_retries(monkeypatch, clock):
+    client = HTTPClient(retries=1, backoff=0)
+    responses = [Response(503), Response(502)]
+    upstream(monkeypatch, client, *responses)
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        client.get('http://upstream/', stream=True)
+    assert all(response.closed for response in responses)
+    assert error.value.response is responses[-1]
@@ -0,0 +1,45 @@
+from genai.library_summary import summarize_library, prioritize_movies, estimate_tokens
+from storage.snapshots import MovieSnapshot
+import ast
+
+
+def movie(number, title=None, director=None, year=None, rating=None):
+    return MovieSnapshot(number, 1, number, title or f"Movie number {number}", director, year, rating, None, None)
+
+
+def large_library(size=2000):
+    return [movie(number, director=f"Director {number % 40}", year=1950 + number % 70, rating=number % 10)
+            for number in range(size)]
+
+
+def test_small_library_is_sent_in_full():
+    movies = [movie(1, 'Heat'), movie(2, 'Up')]
+    contents, tokens, listed = summarize_library(movies, 'Happy', 400)
+    assert ast.literal_eval(contents) == [['Heat', 'Up'], 'Happy']
+    assert (tokens, listed) == (estimate_tokens(contents), 2)
+
+
+def test_large_library_fits_the_budget():
+    movies = large_library()
+    contents, tokens, listed = summarize_library(movies, 'Happy', 400)
+    titles, mood, stats = ast.literal_eval(contents)
+    assert tokens <= 400 and 0 < listed == len(titles) < len(movies)
+    assert mood == 'Happy'
+    assert (stats['total'], stats['listed']) == (2000, listed)
+    assert len(stats['decades']) == 5 and len(stats['top_directors']) == 5
+
+
+def test_listed_titles_are_representative():
+    movies = large_library()
+    titles = ast.literal_eval(summarize_library(movies, 'Happy', 400)[0])[0]
+    listed = [movie for movie in movies if movie.title in titles]
+    assert max(movie.rating for movie in movies) in {movie.rating for movie in listed}
+    assert max(movie.year for movie in movies) in {movie.year for movie in listed}
+    assert len({movie.director for movie in listed}) > 10
+
+
+def test_prioritize_movies_keeps_every_movie_once():
+    movies = large_library(300) + [movie(999, 'Unrated')]
+    ordered = prioritize_movies(movies)
+    assert sorted(movie.id for movie in ordered) == sorted(movie.id for movie in movies)
+    assert ordered[-1].title == 'Unrated'
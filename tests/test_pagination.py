@@ -0,0 +1,15 @@
+from storage.pagination import encode_cursor, decode_cursor
+import pytest
+
+
+@pytest.mark.parametrize('values', [['users', 'Zoë', 12], ['rating:1', 8.5, 3], ['title:0', None, 1], []])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert '=' not in cursor and '/' not in cursor and '+' not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize('cursor', ['%%%', 'e30', 'bm90IGpzb24', '_-8', 'Ig'])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,83 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from network.http_client import HTTPClient
+from storage.poster_cache import PosterCache, PosterError, POSTER_SIZES
+from storage import poster_cache
+from PIL import Image
+import threading
+import socket
+import io
+import os
+import pytest
+
+
+@pytest.fixture
+def server():
+
+    """Local HTTP server answering every GET with the Host header it received."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = self.headers['Host'].encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def resolver(*answers):
+
+    """Fake getaddrinfo answering with the given addresses, in turn."""
+
+    answers = list(answers)
+
+    def getaddrinfo(host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (answers.pop(0), port))]
+
+    return getaddrinfo
+
+
+def test_downloads_connect_to_the_checked_address(tmp_path, monkeypatch, server):
+    monkeypatch.setattr(poster_cache, 'check_poster_url', lambda url, allow_private=False: '127.0.0.1')
+    posters = PosterCache(str(tmp_path), HTTPClient(retries=0))
+    port = server.server_address[1]
+    assert posters.download(f'http://posters.example:{port}/heat.jpg') == f'posters.example:{port}'.encode()
+
+
+def test_rebinding_to_a_private_address_is_refused(tmp_path, monkeypatch, server):
+    port = server.server_address[1]
+    monkeypatch.setattr(poster_cache.socket, 'getaddrinfo', resolver('93.184.216.34', '127.0.0.1'))
+    posters = PosterCache(str(tmp_path), HTTPClient(retries=0))
+    with pytest.raises(PosterError, match='not a public address'):
+        posters.download(f'http://posters.example:{port}/heat.jpg')
+
+
+def poster(color):
+    output = io.BytesIO()
+    Image.new('RGB', (40, 60), color).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def test_eviction_drops_the_url_mappings_of_evicted_posters(tmp_path, monkeypatch):
+    posters = PosterCache(str(tmp_path), HTTPClient(), allow_private=True)
+    monkeypatch.setattr(posters, 'download', lambda url: poster('red' if 'heat' in url else 'blue'))
+    heat = posters.fetch('http://posters.example/heat.jpg')
+    for root, _, names in os.walk(tmp_path):
+        for name in names:
+            os.utime(os.path.join(root, name), (1000, 1000))
+    jaws = posters.fetch('http://posters.example/jaws.jpg')
+    kept = [posters._url_path('http://posters.example/jaws.jpg')]
+    kept += [posters._image_path(jaws, size) for size in POSTER_SIZES]
+    posters.max_bytes = sum(os.path.getsize(path) for path in kept)
+    posters.evict()
+    assert not os.path.exists(posters._url_path('http://posters.example/heat.jpg'))
+    assert not os.path.exists(posters._image_path(heat, 'thumb'))
+    assert all(os.path.exists(path) for path in kept)
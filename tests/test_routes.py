@@ -0,0 +1,47 @@
+from storage.pagination import encode_cursor
+import pytest
+
+
+@pytest.fixture
+def library(web_app):
+
+    """Adds a user with the movies Inception and Heat and returns the user ID and the entry ID of Heat."""
+
+    data_manager = web_app.data_manager
+    with web_app.app.app_context():
+        user_id = data_manager.add_user(f"user {len(data_manager.get_all_users())}")
+        data_manager.add_movie('Inception', user_id, 'Christopher Nolan', 2010, 8.8, None)
+        data_manager.add_movie('Heat', user_id, 'Michael Mann', 1995, 8.3, None)
+        heat = next(movie for movie in data_manager.get_user_movies(user_id) if movie.title == 'Heat')
+    return user_id, heat.id
+
+
+def library_titles(web_app, user_id):
+    with web_app.app.app_context():
+        return sorted(movie.title for movie in web_app.data_manager.get_user_movies(user_id))
+
+
+def test_form_update_rejects_a_duplicate_title(web_app, client, library):
+    user_id, heat_id = library
+    response = client.post(f"/users/{user_id}/update_movie/{heat_id}",
+                           data={'title': 'Inception', 'director': 'Someone Else', 'year': '2011', 'rating': '7'})
+    assert b'The movie is already in the database.' in response.data
+    assert b'successfully updated' not in response.data
+    assert library_titles(web_app, user_id) == ['Heat', 'Inception']
+
+
+def test_api_patch_rejects_a_duplicate_title(web_app, client, library):
+    user_id, heat_id = library
+    response = client.patch(f"/api/v1/users/{user_id}/movies",
+                            json={'movies': [{'id': heat_id, 'title': 'inception', 'director': 'Someone Else'}]})
+    assert response.status_code == 409
+    assert library_titles(web_app, user_id) == ['Heat', 'Inception']
+
+
+@pytest.mark.parametrize('values', [['title:0', [1], 1], ['title:0', 'Heat', {'a': 1}]])
+def test_tampered_cursor_is_not_a_server_error(web_app, client, library, values):
+    user_id, _ = library
+    cursor = encode_cursor(values)
+    assert client.get(f"/users/{user_id}/?cursor={cursor}").status_code == 200
+    assert client.get(f"/api/v1/users/{user_id}/movies?cursor={cursor}").status_code == 400
+    assert client.get(f"/api/v1/users?cursor={encode_cursor(['users', {'a': 1}, 1])}").status_code == 400
@@ -0,0 +1,33 @@
+import os
+import pytest
+
+os.environ.setdefault('GEMINI_API_KEY', 'test')  # the module creates its Gemini client on import
+from genai.movies_rec_ai import RecommendationStreamParser, parse_recommendation_stream, parse_recommendations
+
+RESPONSE = ("Here you go: [{'title': 'Heat {1995}', 'comment': 'It\\'s \"great\" }'}, "
+            "{'title': 'Up', 'comment': 'fun'}, {\"title\": \"Jaws\", \"comment\": \"x\"}]")
+MOVIES = [{'title': 'Heat {1995}', 'comment': 'It\'s "great" }'}, {'title': 'Up', 'comment': 'fun'},
+          {'title': 'Jaws', 'comment': 'x'}]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, len(RESPONSE)])
+def test_chunk_boundaries_do_not_matter(size):
+    chunks = [RESPONSE[index:index + size] for index in range(0, len(RESPONSE), size)]
+    assert list(parse_recommendation_stream(chunks)) == MOVIES
+
+
+def test_movies_are_yielded_as_soon_as_they_close():
+    parser = RecommendationStreamParser()
+    assert list(parser.feed("[{'title': 'Up'}, {'title': 'He")) == [{'title': 'Up'}]
+    assert list(parser.feed("at'}")) == [{'title': 'Heat'}]
+
+
+def test_invalid_and_non_dict_objects_are_skipped():
+    chunks = ["[{'title': }, {1, 2}", ", {'title': 'Up'}]"]
+    assert list(parse_recommendation_stream(chunks)) == [{'title': 'Up'}]
+
+
+def test_parse_recommendations_reads_the_whole_list():
+    assert parse_recommendations("Sure! [{'title': 'Up'}] Enjoy") == [{'title': 'Up'}]
+    assert parse_recommendations('[]') is None
+    assert parse_recommendations('no list [') is None